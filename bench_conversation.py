@@ -0,0 +1,63 @@
+"""
+Замер стадий команд диалога по отдельности: поиск команды, разбор, проверка, расчет, ответ.
+
+Стадия сохранения (база, журнал) не замеряется, так как пишет на диск.
+База создается во временном каталоге.
+
+Запуск: python bench_conversation.py [число_повторов]
+"""
+import os
+import sys
+import timeit
+import tempfile
+
+NUMBER = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+SAMPLES = {
+    "alcohol_calculation": "84.8 82.2 15",
+    "fractions": "47 29",
+    "speed": "47",
+    "set_constants": "50 5 20 2 10 81.5",
+    "set_correction": "84.8 82.2 78.5",
+}
+
+
+def bench(function):
+    """
+    Возвращает среднее время вызова в микросекундах.
+    """
+    return timeit.timeit(function, number=NUMBER) / NUMBER * 1e6
+
+
+def main():
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        run()
+
+
+def run():
+    import logging
+    logging.disable(logging.INFO)
+    import bot_handlers
+
+    engine = bot_handlers.conversation
+    chat_id = "0"
+    print(f"Повторов: {NUMBER}, время в мкс на вызов")
+    print(f"{'команда':<32}{'поиск':>8}{'разбор':>8}{'провер.':>8}{'расчет':>8}{'ответ':>8}")
+    for name, text in SAMPLES.items():
+        command = engine.get(name)
+        values = command.parse(text)
+        result = command.compute(chat_id, values)
+        timings = [
+            bench(lambda: engine.get(name)),
+            bench(lambda: command.parse(text)),
+            bench(lambda: command.validate(values)) if command.validate else 0.0,
+            bench(lambda: command.compute(chat_id, values)),
+            bench(lambda: command.format(result)),
+        ]
+        print(f"{name:<32}" + "".join(f"{t:8.2f}" for t in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Замер времени холодного запуска.
+
+Каждый прогон выполняется в отдельном процессе: импорт bot_handlers, create_app()
+и первый запрос к /healthz. Печатает медианы по прогонам и пиковую память процесса.
+
+Запуск: python bench_startup.py [число_прогонов]
+"""
+import os
+import sys
+import json
+import statistics
+import subprocess
+import tempfile
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+CHILD = r"""
+import json, resource, time
+started = time.perf_counter()
+import bot_handlers
+imported = time.perf_counter()
+app = bot_handlers.create_app()
+created = time.perf_counter()
+response = app.test_client().get("/healthz")
+checked = time.perf_counter()
+print(json.dumps({
+    "import_bot_handlers": imported - started,
+    "create_app": created - imported,
+    "first_healthz": checked - created,
+    "total": checked - started,
+    "status": response.status_code,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+
+def run_once(workdir):
+    env = dict(os.environ)
+    env.setdefault("TOKEN", "0:benchmark")
+    env["PYTHONPATH"] = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        results = [run_once(workdir) for _ in range(RUNS)]
+    print(f"Прогонов: {RUNS}, статус /healthz: {results[-1]['status']}")
+    for key in ("import_bot_handlers", "create_app", "first_healthz", "total"):
+        print(f"{key:>20}: {statistics.median(r[key] for r in results) * 1000:8.1f} мс")
+    print(f"{'max_rss':>20}: {statistics.median(r['max_rss_kb'] for r in results) / 1024:8.1f} МБ")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,291 +1,182 @@
+import io
 import os
-import json
-import telebot
-from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
-from flask import Flask, request
+import time
+import functools
+import itertools
 from tables import get_liquid_table, get_vapor_table
 from calculations import calculate_speed, calculate_fractions, calculate_alcohol_content, correct_for_temperature
+from calculations import add_calibration_point, calibration_coefficients, evaluate_calibration
+from user_records import UserRecord, DEFAULT_RECORD
+from storage import UserStore
+from export import iter_export, iter_chunks, EXPORT_FORMATS, EXPORT_PART_SIZE, TELEGRAM_MESSAGE_LIMIT
+from history import CalculationHistory
+from conversation import ConversationEngine, Command, NumberParser
 import logging
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
-
 # Токен бота из переменных среды
 TOKEN = os.getenv("TOKEN")
-bot = telebot.TeleBot(TOKEN)
-app = Flask(__name__)
 
-# Путь к файлу базы данных
-DATABASE_FILE = os.path.join(os.getcwd(), "user_data.json")
-logging.info(f"Путь к файлу: {os.path.abspath(DATABASE_FILE)}")
+# Бот создается в create_app(), чтобы импорт модуля не тянул telebot и Flask
+bot = None
 
-# Словарь для хранения состояния пользователей
-user_states = {}
+# Путь к файлу базы данных и к старому JSON-файлу для однократной миграции
+DATABASE_FILE = os.path.join(os.getcwd(), "user_data.db")
+LEGACY_DATABASE_FILE = os.path.join(os.getcwd(), "user_data.json")
 
-# Загрузка данных из базы
-def load_from_database():
-    if not os.path.exists(DATABASE_FILE):
-        logging.info("Файл базы данных не найден. Возвращаю пустой словарь.")
-        return {}
-    try:
-        with open(DATABASE_FILE, "r", encoding="utf-8") as file:
-            data = file.read()
-            if not data.strip():
-                logging.info("Файл базы данных пуст. Возвращаю пустой словарь.")
-                return {}
-            return json.loads(data)
-    except json.JSONDecodeError:
-        logging.error("Ошибка декодирования JSON. Возвращаю пустой словарь.")
-        return {}
-
-
-def save_to_database(data):
-    try:
-        # Проверка данных на корректность
-        json.dumps(data)
-        with open(DATABASE_FILE, "w", encoding="utf-8") as file:
-            json.dump(data, file, ensure_ascii=False, indent=4)
-        logging.info("Данные успешно сохранены в базу данных.")
-    except Exception as e:
-        logging.error(f"Ошибка при сохранении данных: {e}")
+# Размер LRU-кэша записей пользователей
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
 
-def print_database_content():
-    """
-    Выводит содержимое базы данных.
-    """
-    try:
-        with open(DATABASE_FILE, "r", encoding="utf-8") as file:
-            data = json.load(file)
-            if not data:
-                return "База данных пуста."
-            # Формируем строку с содержимым базы данных
-            content = "Вот что мы сохранили:\n"
-            for user_id, constants in data.items():
-                content += f"  Пользователь ID: {user_id}\n"
-                content += f"  Объем куба: {constants.get('cube_volume')} л\n"
-                content += f"  Процент голов: {constants.get('head_percentage')}%\n"
-                content += f"  Процент тела: {constants.get('body_percentage')}%\n"
-                content += f"  Процент предхвостьев: {constants.get('pre_tail_percentage')}%\n"
-                content += f"  Процент хвостов: {constants.get('tail_percentage')}%\n"
-                content += f"  Средняя крепость голов: {constants.get('average_head_strength')}%\n"
-            return content
-    except Exception as e:
-        logging.error(f"Ошибка при чтении базы данных: {e}")
-        return "Не удалось прочитать базу данных."
+# Каталог журнала расчетов пользователей
+HISTORY_DIR = os.path.join(os.getcwd(), "history")
 
-# Расчеты
+# ID чатов администраторов через запятую (для /export)
+ADMIN_IDS = frozenset(filter(None, (x.strip() for x in os.getenv("ADMIN_IDS", "").split(","))))
+
+# Словарь для хранения состояния пользователей
+user_states = {}
 
-def linear_interpolation(x, x1, x2, y1, y2):
+def format_constants(constants):
     """
-    Выполняет линейную интерполяцию для заданных значений.
-    :param x: Значение, для которого нужно интерполировать y.
-    :param x1, x2: Границы интервала по x.
-    :param y1, y2: Границы интервала по y.
-    :return: Интерполированное значение y.
+    Формирует сообщение с константами одного пользователя.
     """
-    return y1 + (y2 - y1) * (x - x1) / (x2 - x1)
+    return (
+        f"Объем куба: {constants.cube_volume} л\n"
+        f"Процент голов: {constants.head_percentage}%\n"
+        f"Процент тела: {constants.body_percentage}%\n"
+        f"Процент предхвостьев: {constants.pre_tail_percentage}%\n"
+        f"Процент хвостов: {constants.tail_percentage}%\n"
+        f"Средняя крепость голов: {constants.average_head_strength}%\n"
+    )
 
-def find_closest_values(value, data):
+# Шаблоны ответов
+ALCOHOL_TEMPLATE = "Спиртуозность при 20°C: {:.2f}%"
+FRACTIONS_TEMPLATE = (
+    "Объем абсолютного спирта: {absolute_alcohol:.2f} л\n"
+    "Головы (по объему): {heads_by_volume:.2f} л\n"
+    "Головы (по АС): {heads_by_alcohol:.2f} л\n"
+    "Тело: {body:.2f} л\n"
+    "Предхвостья: {pre_tails:.2f} л\n"
+    "Хвосты: {tails:.2f} л"
+)
+SPEED_TEMPLATE = (
+    "Минимальная скорость отбора: {:.2f} л/ч \n"
+    "Максимальная скорость отбора: {:.2f} л/ч"
+)
+CALIBRATION_TEMPLATE = (
+    "Точка калибровки добавлена: поправка {correction:.2f}%\n"
+    "Всего точек: {points}\n"
+    "Поправка = {intercept:.3f} + {slope:.4f} × спиртуозность\n"
+    "Диапазон калибровки: {min_x:.1f}–{max_x:.1f}%"
+)
+
+def format_alcohol(alcohol_content):
+    return ALCOHOL_TEMPLATE.format(alcohol_content)
+
+def format_fractions(fractions):
+    return FRACTIONS_TEMPLATE.format_map(fractions)
+
+def format_speed(speed, max_speed):
+    return SPEED_TEMPLATE.format(speed, max_speed)
+
+# Журнал расчетов
+
+FRACTION_KEYS = ("absolute_alcohol", "heads_by_volume", "heads_by_alcohol", "body", "pre_tails", "tails")
+
+HISTORY_TITLES = {
+    "alcohol": "Спиртуозность",
+    "fractions": "Фракции",
+    "speed": "Скорость отбора",
+    "correction": "Калибровка",
+}
+HISTORY_PAGE_SIZE = 10
+HISTORY_MAX_PAGE_SIZE = 50
+
+def format_history_result(entry):
+    kind, outputs = entry["k"], entry["out"]
+    if kind == "alcohol":
+        return f"{outputs[0]:.2f}%"
+    if kind == "fractions":
+        fractions = dict(zip(FRACTION_KEYS, outputs))
+        return (f"АС {fractions['absolute_alcohol']:.2f} л, головы {fractions['heads_by_volume']:.2f} л, "
+                f"тело {fractions['body']:.2f} л")
+    if kind == "speed":
+        return f"{outputs[0]:.2f}–{outputs[1]:.2f} л/ч"
+    if kind == "correction":
+        return f"поправка {outputs[0]:.2f}%"
+    return " ".join(f"{x:g}" for x in outputs)
+
+def format_history_entry(entry):
     """
-    Находит два ближайших значения в массиве.
-    :param value: Искомое значение.
-    :param data: Отсортированный массив данных.
-    :return: Два ближайших значения из массива.
+    Формирует строку журнала: время, тип расчета, ввод и результат.
     """
-    data = sorted(data)
-    for i in range(len(data) - 1):
-        if data[i] <= value <= data[i + 1]:
-            return data[i], data[i + 1]
-    raise ValueError("Значение вне диапазона данных.")
-
+    moment = time.strftime("%d.%m.%Y %H:%M", time.localtime(entry["t"]))
+    title = HISTORY_TITLES.get(entry["k"], entry["k"])
+    inputs = " ".join(f"{x:g}" for x in entry["in"])
+    return f"{moment} {title}: {inputs} → {format_history_result(entry)}"
 
-def calculate_alcohol_content(cube_temp, vapor_temp, liquid_table, vapor_table):
+def iter_history_csv(entries):
     """
-    Рассчитывает содержание спирта в дистилляте.
-    Учитывает зависимость пара от температуры жидкости.
+    Генерирует строки CSV журнала (без заголовка).
     """
-    try:
-        logging.info(f"Расчет содержания спирта: cube_temp={cube_temp}, vapor_temp={vapor_temp}")
-
-        # Интерполяция для жидкости
-        cube_temps = list(liquid_table.keys())
-        logging.debug(f"Температуры жидкости: {cube_temps}")
-        cube_temp1, cube_temp2 = find_closest_values(cube_temp, cube_temps)
-        logging.debug(f"Ближайшие температуры жидкости: {cube_temp1}, {cube_temp2}")
-
-        liquid_alcohol1 = liquid_table[cube_temp1]
-        liquid_alcohol2 = liquid_table[cube_temp2]
-        logging.debug(f"Содержание спирта в жидкости: {liquid_alcohol1}, {liquid_alcohol2}")
-
-        liquid_alcohol = linear_interpolation(cube_temp, cube_temp1, cube_temp2, liquid_alcohol1, liquid_alcohol2)
-        logging.debug(f"Интерполированное содержание спирта в жидкости: {liquid_alcohol}")
-
-        # Интерполяция для пара
-        vapor_temps = list(vapor_table.keys())
-        logging.debug(f"Температуры пара: {vapor_temps}")
-        vapor_temp1, vapor_temp2 = find_closest_values(vapor_temp, vapor_temps)
-        logging.debug(f"Ближайшие температуры пара: {vapor_temp1}, {vapor_temp2}")
-
-        vapor_alcohol1 = vapor_table[vapor_temp1]
-        vapor_alcohol2 = vapor_table[vapor_temp2]
-        logging.debug(f"Содержание спирта в паре: {vapor_alcohol1}, {vapor_alcohol2}")
-
-        vapor_alcohol = linear_interpolation(vapor_temp, vapor_temp1, vapor_temp2, vapor_alcohol1, vapor_alcohol2)
-        logging.debug(f"Интерполированное содержание спирта в паре: {vapor_alcohol}")
-
-        return vapor_alcohol
-    except Exception as e:
-        logging.error(f"Ошибка в calculate_alcohol_content: {e}")
-        raise
+    for entry in entries:
+        moment = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["t"]))
+        inputs = " ".join(f"{x:g}" for x in entry["in"])
+        outputs = " ".join(f"{x:.4g}" for x in entry["out"])
+        yield f"{moment},{entry['k']},{inputs},{outputs}\n"
 
+# Расчеты
 
-def correct_for_temperature(alcohol_content, distillate_temp):
+def check_still_temperatures(cube_temp, vapor_temp):
     """
-    Корректирует спиртуозность для приведения её к температуре 20°C.
-    :param alcohol_content: Спиртуозность при текущей температуре (%).
-    :param distillate_temp: Температура дистиллята (°C).
-    :return: Скорректированная спиртуозность при 20°C (%).
+    Проверяет температуры куба и пара по диапазону таблиц равновесия.
+    :raises ValueError: Если температура вне диапазона таблиц.
     """
-    try:
-        logging.info(
-            f"Корректировка спиртуозности: alcohol_content={alcohol_content}, distillate_temp={distillate_temp}")
-
-        correction_table = {
-            10: 0.6,
-            15: 0.4,
-            20: 0.0,
-            25: -0.3,
-            30: -0.6
-        }
-        temp_values = list(correction_table.keys())
-        logging.debug(f"Температуры для коррекции: {temp_values}")
-        temp1, temp2 = find_closest_values(distillate_temp, temp_values)
-        logging.debug(f"Ближайшие температуры для коррекции: {temp1}, {temp2}")
-
-        correction1 = correction_table[temp1]
-        correction2 = correction_table[temp2]
-        logging.debug(f"Коэффициенты коррекции: {correction1}, {correction2}")
-
-        correction = linear_interpolation(distillate_temp, temp1, temp2, correction1, correction2)
-        logging.debug(f"Интерполированный коэффициент коррекции: {correction}")
-
-        corrected_alcohol = alcohol_content + correction
-        logging.debug(f"Скорректированная спиртуозность: {corrected_alcohol}")
-
-        return corrected_alcohol
-    except Exception as e:
-        logging.error(f"Ошибка в correct_for_temperature: {e}")
-        raise
+    if not (78.15 <= cube_temp <= 100):
+        raise ValueError("Температура в кубе должна быть в диапазоне 78.15–100°C.")
+    if not (78.15 <= vapor_temp <= 100):
+        raise ValueError("Температура пара должна быть в диапазоне 78.15–100°C.")
 
-
-def calculate_correction(cube_temp, vapor_temp, measured_alcohol_content, liquid_table, vapor_table):
+def check_alcohol_temperatures(cube_temp, vapor_temp, distillate_temp):
     """
-    Рассчитывает поправку для спиртуозности на основе показаний ареометра.
-    :param cube_temp: Температура в кубе (°C).
-    :param vapor_temp: Температура в паровой зоне (°C).
-    :param measured_alcohol_content: Показания спиртового ареометра (%).
-    :param liquid_table: Таблица равновесия для жидкости.
-    :param vapor_table: Таблица равновесия для пара.
-    :return: Поправка для спиртуозности (%).
+    Проверяет диапазоны температур для расчета спиртуозности.
+    :raises ValueError: Если температура вне диапазона таблиц.
     """
-    # Рассчитываем теоретическую спиртуозность на основе температур
-    theoretical_alcohol_content = calculate_alcohol_content(cube_temp, vapor_temp, liquid_table, vapor_table)
-
-    # Сравниваем теоретическое значение с показаниями ареометра
-    correction = measured_alcohol_content - theoretical_alcohol_content
-
-    return correction
+    check_still_temperatures(cube_temp, vapor_temp)
+    if not (10 <= distillate_temp <= 30):
+        raise ValueError("Температура дистиллята должна быть в диапазоне 10–30°C.")
 
 def apply_correction(alcohol_content, user_constants, chat_id):
     """
-    Применяет сохраненную поправку к рассчитанной спиртуозности.
+    Применяет сохраненную калибровку (или старую поправку-смещение) к рассчитанной спиртуозности.
     :param alcohol_content: Рассчитанная спиртуозность (%).
     :param user_constants: Константы пользователя.
     :param chat_id: ID чата пользователя.
     :return: Скорректированная спиртуозность (%).
     """
-    correction = user_constants.get(chat_id, {}).get("correction", 0.0)
-    return alcohol_content + correction
-
-
-def calculate_fractions(user_id, total_volume_liters, alcohol_content):
-    """
-    Рассчитывает объемы фракций дистиллята на основе констант пользователя или значений по умолчанию.
-    :param user_id: ID пользователя (строка).
-    :param total_volume_liters: Общий объем спиртосодержащей смеси (л).
-    :param alcohol_content: Крепость спиртосодержащей смеси (%).
-    :return: Словарь с объемами фракций.
-    """
-    # Преобразуем user_id в строку для работы с JSON
-    user_id = str(user_id)
-
-    # Получаем константы пользователя или используем значения по умолчанию
-    constants = user_constants.get(user_id, get_default_constants())
-
-    # Извлекаем константы
-    cube_volume = constants["cube_volume"]
-    head_percentage = constants["head_percentage"]
-    body_percentage = constants["body_percentage"]
-    pre_tail_percentage = constants["pre_tail_percentage"]
-    tail_percentage = constants["tail_percentage"]
-    average_head_strength = constants["average_head_strength"]
-
-    # Переводим литры в миллилитры
-    total_volume_ml = total_volume_liters * 1000
-    absolute_alcohol_ml = total_volume_ml * alcohol_content / 96.6
-
-    # Расчет объемов фракций
-    heads_by_volume_ml = (total_volume_ml * head_percentage / 100)  # Процент голов от объема СС
-    heads_by_alcohol_ml = absolute_alcohol_ml * (head_percentage / 100)  # Процент голов от АС
-    body_ml = total_volume_ml * (body_percentage / 100)  # Процент тела от объема СС
-    pre_tails_ml = total_volume_ml * (pre_tail_percentage / 100)  # Процент предхвостьев от объема СС
-    tails_ml = total_volume_ml * (tail_percentage / 100)  # Процент хвостов от объема СС
-
-    # Переводим обратно в литры
-    return {
-        "absolute_alcohol": absolute_alcohol_ml / 1000,
-        "heads_by_volume": heads_by_volume_ml / 1000,
-        "heads_by_alcohol": heads_by_alcohol_ml / 1000,
-        "body": body_ml / 1000,
-        "pre_tails": pre_tails_ml / 1000,
-        "tails": tails_ml / 1000,
-    }
-
-
-def calculate_speed(user_id, raw_spirit_liters, user_constants):
-    """
-    Рассчитывает скорость отбора на основе объема куба и количества залитого спирта-сырца.
-    :param user_id: ID пользователя (строка).
-    :param raw_spirit_liters: Количество залитого спирта-сырца (л).
-    :return: Минимальная скорость (л/ч) и максимальная скорость (л/ч).
-    """
-    # Преобразуем user_id в строку для работы с JSON
-    user_id = str(user_id)
-    constants = user_constants.get(user_id, get_default_constants())
-    cube_volume = constants.get("cube_volume", 50)
-    if not (20 <= cube_volume <= 100):
-        raise ValueError("Объем куба вне допустимого диапазона (20–100 литров).")
-    speed_coefficient = 700 if 20 <= cube_volume <= 37 else 600 if 37 < cube_volume <= 50 else 500
-    speed = (raw_spirit_liters * 0.35 / speed_coefficient) * 60
-    max_speed = speed * 2
-    return speed, max_speed
+    constants = user_constants.get(chat_id, DEFAULT_RECORD)
+    calibration = constants.calibration
+    if calibration:
+        return alcohol_content + evaluate_calibration(calibration, alcohol_content)
+    # Старая поправка-смещение, перенесенная из схемы 1
+    return alcohol_content + constants.offset
 
 
-# Глобальная переменная для хранения данных пользователей
-user_constants = load_from_database()
 
-def get_default_constants():
+# Хранилище записей пользователей; записи загружаются по первому обращению
+user_constants = UserStore(DATABASE_FILE, cache_size=USER_CACHE_SIZE, legacy_path=LEGACY_DATABASE_FILE)
+
+# Журнал расчетов; запись выполняется фоновым потоком
+calculation_history = CalculationHistory(HISTORY_DIR)
+
+def get_user_record(chat_id):
     """
-    Возвращает константы по умолчанию для нового пользователя.
+    Возвращает копию записи пользователя для изменения (или новую запись).
+    Изменения сохраняются присваиванием user_constants[chat_id] = record.
     """
-    return {
-        "cube_volume": 50,
-        "head_percentage": 5,
-        "body_percentage": 18,
-        "pre_tail_percentage": 2,
-        "tail_percentage": 10,
-        "average_head_strength": 81.5,
-    }
+    record = user_constants.get(chat_id)
+    if record is None:
+        return UserRecord()
+    return record.copy()
 
 def main_menu():
     """
@@ -298,46 +189,33 @@ def main_menu():
         "/speed — Расчет скорости отбора\n"
         "/constants — Просмотр текущих констант (объем куба, проценты фракций)\n"
         "/set_constants — Установка новых значений констант\n"
-        "/set_correction — Тест\n"
+        "/set_correction — Добавить точку калибровки ареометра\n"
+        "/reset_correction — Сбросить калибровку ареометра\n"
+        "/history — Последние расчеты (/history_csv — выгрузка в CSV)\n"
         "/help — Инструкция по работе с ботом.\n"
+        "Быстрый расчет в любом чате: @имя_бота 84.8 82.2 15\n"
     )
 
-@bot.message_handler(commands=['start'])
 def start(message):
     bot.send_message(message.chat.id, main_menu())
 
-@bot.message_handler(commands=['alcohol_calculation'])
-def calculate_start(message):
+def start_command(command, message):
+    """
+    Запускает команду диалога: переводит пользователя в ожидание ввода и отправляет приглашение.
+    :param command: Команда из таблицы conversation.
+    """
     chat_id = str(message.chat.id)  # Преобразуем ID в строку для JSON
-    # Логируем начало процесса расчета спиртуозности
-    logging.info(f"Пользователь {chat_id} начал расчет спиртуозности.")
-    # Устанавливаем состояние пользователя
-    user_states[chat_id] = "awaiting_alcohol_input"
-    # Отправляем сообщение пользователю
-    bot.send_message(chat_id,
-                     "Введите температуры куба, пара и дистиллята через пробел (например: 84.8 82.2 15):")
 
-@bot.message_handler(commands=['fractions'])
-def fractions_start(message):
-    chat_id = str(message.chat.id)  # Преобразуем ID в строку для JSON
-    # Логируем начало процесса расчета раздела на фракции
-    logging.info(f"Пользователь {chat_id} начал расчет фракций.")
-    # Устанавливаем состояние пользователя
-    user_states[chat_id] = "awaiting_fractions_input"
-    bot.send_message(chat_id,
-                     "Введите объем спиртосодержащей смеси (л), её крепость (%) через пробел (например: 47 29):")
+    # Проверяем, находится ли пользователь уже в каком-либо состоянии
+    if command.exclusive and chat_id in user_states:
+        bot.send_message(chat_id, "Вы уже находитесь в процессе выполнения другой команды. Завершите её или начните заново.")
+        return
 
-@bot.message_handler(commands=['speed'])
-def speed_start(message):
-    chat_id = str(message.chat.id)  # Преобразуем ID в строку для JSON
-    # Логируем начало процесса расчета скорости отбора
-    logging.info(f"Пользователь {chat_id} начал расчет скорости отбора.")
     # Устанавливаем состояние пользователя
-    user_states[chat_id] = "awaiting_speed_input"
-    bot.send_message(chat_id,
-                     "Введите количество залитого спирта-сырца (л) (например: 47):")
+    user_states[chat_id] = command.name
+    logging.info(f"Пользователь {chat_id} начал команду /{command.name}.")
+    bot.send_message(chat_id, command.prompt)
 
-@bot.message_handler(commands=['constants'])
 def show_constants(message):
     """
     Показывает текущие константы пользователя.
@@ -350,53 +228,111 @@ def show_constants(message):
 
     if not constants:
         bot.send_message(chat_id, "У вас пока нет сохраненных констант. Используются стандартные значения.")
-        constants = get_default_constants()
+        constants = DEFAULT_RECORD
 
     # Формируем сообщение с текущими константами
-    response = (
-        f"Текущие константы:\n"
-        f"Объем куба: {constants.get('cube_volume', 'Не задано')} л\n"
-        f"Процент голов: {constants.get('head_percentage', 'Не задано')}%\n"
-        f"Процент тела: {constants.get('body_percentage', 'Не задано')}%\n"
-        f"Процент предхвостьев: {constants.get('pre_tail_percentage', 'Не задано')}%\n"
-        f"Процент хвостов: {constants.get('tail_percentage', 'Не задано')}%\n"
-        f"Средняя крепость голов: {constants.get('average_head_strength', 'Не задано')}%\n"
-    )
-    bot.send_message(chat_id, response)
+    bot.send_message(chat_id, "Текущие константы:\n" + format_constants(constants))
 
-@bot.message_handler(commands=['set_constants'])
-def set_constants(message):
-    chat_id = str(message.chat.id)  # Преобразуем ID в строку для JSON
+def reset_correction(message):
+    chat_id = str(message.chat.id)
+    constants = user_constants.get(chat_id)
+    if constants is None or not constants.has_correction:
+        bot.send_message(chat_id, "Калибровка не задана.")
+        return
+    constants = constants.copy()
+    constants.set_calibration(None)
+    user_constants[chat_id] = constants
+    logging.info(f"Пользователь {chat_id} сбросил калибровку.")
+    bot.send_message(chat_id, "Калибровка сброшена.")
 
-    # Проверяем, находится ли пользователь уже в каком-либо состоянии
-    if chat_id in user_states:
-        bot.send_message(chat_id, "Вы уже находитесь в процессе выполнения другой команды. Завершите её или начните заново.")
+def export_command(message):
+    """
+    Выгружает записи всех пользователей (только для администраторов).
+    Формат: /export [ndjson|csv]. Небольшая выгрузка приходит сообщением,
+    большая — документами, каждый в пределах лимита Telegram.
+    """
+    chat_id = str(message.chat.id)
+    if chat_id not in ADMIN_IDS:
+        bot.send_message(chat_id, "Команда доступна только администратору.")
         return
 
-    # Устанавливаем состояние пользователя
-    user_states[chat_id] = "awaiting_set_constants_input"
-    logging.info(f"Пользователь {chat_id} начал процесс установки новых констант.")
+    args = message.text.split()
+    export_format = args[1].lower() if len(args) > 1 else "ndjson"
+    if export_format not in EXPORT_FORMATS:
+        bot.send_message(chat_id, f"Неизвестный формат. Доступны: {', '.join(EXPORT_FORMATS)}.")
+        return
 
-    bot.send_message(
-        chat_id,
-        "Введите новые значения через пробел в формате:\n"
-        "объем_куба процент_голов процент_тела процент_предхвостьев процент_хвостов средняя_крепость_голов\n"
-        "Пример: 50 5 20 2 10 81.5"
-    )
+    logging.info(f"Администратор {chat_id} запустил выгрузку в формате {export_format}.")
+    try:
+        chunks = iter_export(user_constants.items(), export_format)
+        first = next(chunks, None)
+        if first is None:
+            bot.send_message(chat_id, "База данных пуста.")
+            return
+        second = next(chunks, None)
+        text = first.decode("utf-8")
+        if second is None and len(text) <= TELEGRAM_MESSAGE_LIMIT:
+            bot.send_message(chat_id, text)
+            return
+
+        parts = itertools.chain([first] if second is None else [first, second], chunks)
+        for number, chunk in enumerate(parts, 1):
+            bot.send_document(chat_id, io.BytesIO(chunk), visible_file_name=f"users_{number:03d}.{export_format}")
+    except Exception as e:
+        logging.error(f"Ошибка выгрузки: {e}")
+        bot.send_message(chat_id, "Не удалось выгрузить базу данных.")
 
-@bot.message_handler(commands=['set_correction'])
-def set_correction(message):
+def history_command(message):
+    """
+    Показывает последние расчеты пользователя.
+    Формат: /history [количество] [страница].
+    """
     chat_id = str(message.chat.id)
-    # Устанавливаем состояние пользователя
-    user_states[chat_id] = "awaiting_correction_input"
-    bot.send_message(chat_id, "Введите температуру куба, паровой зоны и показания ареометра через пробел (например: 84.8 82.2 78.5):")
+    try:
+        args = [int(x) for x in message.text.split()[1:3]]
+    except ValueError:
+        bot.send_message(chat_id, "Формат: /history [количество] [страница], например: /history 10 2")
+        return
+    page_size = min(max(args[0], 1), HISTORY_MAX_PAGE_SIZE) if args else HISTORY_PAGE_SIZE
+    page = max(args[1], 1) if len(args) > 1 else 1
+
+    try:
+        entries = calculation_history.last(chat_id, page_size, skip=(page - 1) * page_size)
+    except Exception as e:
+        logging.error(f"Ошибка чтения журнала расчетов: {e}")
+        bot.send_message(chat_id, "Не удалось прочитать журнал расчетов.")
+        return
+    if not entries:
+        bot.send_message(chat_id, "Журнал расчетов пуст." if page == 1 else "На этой странице записей нет.")
+        return
+    header = f"Последние расчеты (страница {page}):\n"
+    bot.send_message(chat_id, header + "\n".join(format_history_entry(entry) for entry in entries))
+
+def history_csv_command(message):
+    """
+    Выгружает журнал расчетов пользователя в CSV.
+    """
+    chat_id = str(message.chat.id)
+    try:
+        header = "time,kind,inputs,outputs\n"
+        chunks = iter_chunks(iter_history_csv(calculation_history.iter_entries(chat_id)), EXPORT_PART_SIZE, header)
+        sent = False
+        for number, chunk in enumerate(chunks, 1):
+            bot.send_document(chat_id, io.BytesIO(chunk), visible_file_name=f"history_{number:03d}.csv")
+            sent = True
+        if not sent:
+            bot.send_message(chat_id, "Журнал расчетов пуст.")
+    except Exception as e:
+        logging.error(f"Ошибка выгрузки журнала расчетов: {e}")
+        bot.send_message(chat_id, "Не удалось выгрузить журнал расчетов.")
 
-@bot.message_handler(commands=['help'])
 def help_command(message):
     """
     Обработчик команды /help.
     Отправляет сообщение с кнопкой, ведущей на страницу описания бота.
     """
+    from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+
     # Создаем клавиатуру с кнопкой
     keyboard = InlineKeyboardMarkup()
     help_button = InlineKeyboardButton("Открыть инструкцию", url="https://telegra.ph/Kak-polzovatsya-botom-dlya-rascheta-drobnoj-distillyacii-02-03")
@@ -409,171 +345,355 @@ def help_command(message):
         reply_markup=keyboard
     )
 
-@bot.message_handler(func=lambda m: True)
+# Команды диалога: имя команды (оно же состояние пользователя) -> приглашение, разбор,
+# проверка, расчет, сохранение, ответ
+
+def check_constants(values):
+    """
+    Проверяет новые значения констант.
+    :raises ValueError: Если значение вне допустимого диапазона.
+    """
+    cube_volume, head, body, pre_tail, tail, avg_head_strength = values
+    if not (20 <= cube_volume <= 100):
+        raise ValueError("Объем куба должен быть в диапазоне 20–100 литров.")
+    if not all(0 <= x <= 100 for x in (head, body, pre_tail, tail)):
+        raise ValueError("Проценты фракций должны быть в диапазоне 0–100%.")
+    if not (76 <= avg_head_strength <= 95):
+        raise ValueError("Средняя крепость голов должна быть в диапазоне 76–95%.")
+
+def check_fractions_input(values):
+    """
+    Проверяет объем и крепость спиртосодержащей смеси.
+    :raises ValueError: Если значение вне допустимого диапазона.
+    """
+    total_volume_liters, alcohol_content = values
+    if not total_volume_liters > 0:
+        raise ValueError("Объем смеси должен быть больше нуля.")
+    if not (0 < alcohol_content <= 100):
+        raise ValueError("Крепость смеси должна быть в диапазоне 0–100%.")
+
+def check_speed_input(values):
+    """
+    Проверяет количество спирта-сырца.
+    :raises ValueError: Если значение не положительное.
+    """
+    if not values[0] > 0:
+        raise ValueError("Количество спирта-сырца должно быть больше нуля.")
+
+def check_calibration_input(values):
+    """
+    Проверяет точку калибровки: температуры куба и пара и показания ареометра.
+    Ошибочная точка навсегда входит в накопленные суммы, поэтому проверка строже, чем у расчета.
+    :raises ValueError: Если значение вне допустимого диапазона.
+    """
+    cube_temp, vapor_temp, measured_alcohol_content = values
+    check_still_temperatures(cube_temp, vapor_temp)
+    if not (0 <= measured_alcohol_content <= 100):
+        raise ValueError("Показания ареометра должны быть в диапазоне 0–100%.")
+
+def compute_alcohol(chat_id, values):
+    cube_temp, vapor_temp, distillate_temp = values
+    # Выполняем расчет спиртуозности
+    alcohol_content = calculate_alcohol_content(cube_temp, vapor_temp, get_liquid_table(), get_vapor_table())
+    # Корректируем спиртуозность для температуры дистиллята
+    corrected_alcohol = correct_for_temperature(alcohol_content, distillate_temp)
+    # Применяем калибровку пользователя
+    return apply_correction(corrected_alcohol, user_constants, chat_id)
+
+def compute_fractions(chat_id, values):
+    total_volume_liters, alcohol_content = values
+    return calculate_fractions(chat_id, total_volume_liters, alcohol_content, user_constants)
+
+def compute_speed(chat_id, values):
+    return calculate_speed(chat_id, values[0], user_constants)
+
+def compute_constants(chat_id, values):
+    constants = get_user_record(chat_id)
+    constants.set_constants(*values)
+    return constants
+
+def compute_calibration(chat_id, values):
+    cube_temp, vapor_temp, measured_alcohol_content = values
+    # Рассчитываем теоретическую спиртуозность и поправку в этой точке
+    theoretical_alcohol_content = calculate_alcohol_content(cube_temp, vapor_temp, get_liquid_table(), get_vapor_table())
+    correction = measured_alcohol_content - theoretical_alcohol_content
+    # Добавляем точку в калибровку пользователя
+    constants = get_user_record(chat_id)
+    constants.set_calibration(add_calibration_point(constants.calibration, theoretical_alcohol_content, correction))
+    return correction, constants
+
+def save_constants(chat_id, values, constants):
+    logging.info(f"Обновленные константы для chat_id {chat_id}: {constants.constants}")
+    user_constants[chat_id] = constants
+
+def save_calibration(chat_id, values, result):
+    correction, constants = result
+    user_constants[chat_id] = constants
+    calculation_history.record(chat_id, "correction", values, (correction,))
+
+def record_history(kind, outputs):
+    """
+    Возвращает стадию сохранения, записывающую расчет в журнал.
+    """
+    def commit(chat_id, values, result):
+        calculation_history.record(chat_id, kind, values, outputs(result))
+    return commit
+
+def format_constants_saved(constants):
+    return "Константы успешно обновлены!", "Вот что мы сохранили:\n" + format_constants(constants)
+
+def format_calibration(result):
+    correction, constants = result
+    calibration = constants.calibration
+    intercept, slope = calibration_coefficients(calibration)
+    return CALIBRATION_TEMPLATE.format(correction=correction, points=calibration[0], intercept=intercept, slope=slope,
+                                       min_x=calibration[5], max_x=calibration[6])
+
+conversation = ConversationEngine()
+conversation.register(Command(
+    "alcohol_calculation",
+    prompt="Введите температуры куба, пара и дистиллята через пробел (например: 84.8 82.2 15):",
+    parse=NumberParser(3, "Введите три числа через пробел."),
+    validate=lambda values: check_alcohol_temperatures(*values),
+    compute=compute_alcohol,
+    commit=record_history("alcohol", lambda alcohol: (alcohol,)),
+    format=format_alcohol,
+))
+conversation.register(Command(
+    "fractions",
+    prompt="Введите объем спиртосодержащей смеси (л), её крепость (%) через пробел (например: 47 29):",
+    parse=NumberParser(2, "Введите два числа через пробел."),
+    validate=check_fractions_input,
+    compute=compute_fractions,
+    commit=record_history("fractions", lambda fractions: [fractions[key] for key in FRACTION_KEYS]),
+    format=format_fractions,
+))
+conversation.register(Command(
+    "speed",
+    prompt="Введите количество залитого спирта-сырца (л) (например: 47):",
+    parse=NumberParser(1, "Введите одно число."),
+    validate=check_speed_input,
+    compute=compute_speed,
+    commit=record_history("speed", lambda speeds: speeds),
+    format=lambda speeds: format_speed(*speeds),
+))
+conversation.register(Command(
+    "set_constants",
+    prompt=(
+        "Введите новые значения через пробел в формате:\n"
+        "объем_куба процент_голов процент_тела процент_предхвостьев процент_хвостов средняя_крепость_голов\n"
+        "Пример: 50 5 20 2 10 81.5"
+    ),
+    parse=NumberParser(6, "Неверное количество значений. Введите ровно 6 чисел."),
+    validate=check_constants,
+    compute=compute_constants,
+    commit=save_constants,
+    format=format_constants_saved,
+    error_template="Произошла неизвестная ошибка. Попробуйте снова.",
+    exclusive=True,
+))
+conversation.register(Command(
+    "set_correction",
+    prompt="Введите температуру куба, паровой зоны и показания ареометра через пробел (например: 84.8 82.2 78.5):",
+    parse=NumberParser(3, "Введите три числа через пробел."),
+    validate=check_calibration_input,
+    compute=compute_calibration,
+    commit=save_calibration,
+    format=format_calibration,
+))
+
 def handle_input(message):
     chat_id = str(message.chat.id)
-    if chat_id in user_states:
-        state = user_states[chat_id]
-        if state == "awaiting_alcohol_input":
-            try:
-                logging.info(f"Обработка ввода для расчета спиртуозности: {message.text}")
-                # Разбиваем ввод на значения
-                cube_temp, vapor_temp, distillate_temp = map(float, message.text.replace(",", ".").split())
-                # Проверяем диапазоны температур
-                if not (78.15 <= cube_temp <= 100):
-                    raise ValueError("Температура в кубе должна быть в диапазоне 78.15–100°C.")
-                if not (78.15 <= vapor_temp <= 100):
-                    raise ValueError("Температура пара должна быть в диапазоне 78.15–100°C.")
-                if not (10 <= distillate_temp <= 30):
-                    raise ValueError("Температура дистиллята должна быть в диапазоне 10–30°C.")
-
-                # Получаем таблицы равновесия
-                liquid_table = get_liquid_table()
-                vapor_table = get_vapor_table()
-
-                # Выполняем расчет спиртуозности
-                alcohol_content = calculate_alcohol_content(cube_temp, vapor_temp, liquid_table, vapor_table)
-
-                # Корректируем спиртуозность для температуры дистиллята
-                corrected_alcohol = correct_for_temperature(alcohol_content, distillate_temp)
-
-                # Применяем поправку
-                chat_id = str(message.chat.id)
-                final_alcohol = apply_correction(corrected_alcohol, user_constants, chat_id)
-
-                # Отправляем результат пользователю
-                bot.send_message(chat_id, f"Спиртуозность при 20°C: {final_alcohol:.2f}%")
-
-                # Сбрасываем состояние пользователя
-                del user_states[chat_id]
-
-            except ValueError:
-                bot.send_message(chat_id, "Ошибка ввода: Введите три числа через пробел.")
-            except Exception as e:
-                bot.send_message(chat_id, f"Произошла ошибка: {e}")
-
-        elif state == "awaiting_fractions_input":
-            try:
-                # Разбиваем ввод на значения
-                total_volume_liters, alcohol_content = map(float, message.text.replace(",", ".").split())
-
-                # Выполняем расчет фракций
-                fractions = calculate_fractions(chat_id, total_volume_liters, alcohol_content)
-                response = (
-                    f"Объем абсолютного спирта: {fractions['absolute_alcohol']:.2f} л\n"
-                    f"Головы (по объему): {fractions['heads_by_volume']:.2f} л\n"
-                    f"Головы (по АС): {fractions['heads_by_alcohol']:.2f} л\n"
-                    f"Тело: {fractions['body']:.2f} л\n"
-                    f"Предхвостья: {fractions['pre_tails']:.2f} л\n"
-                    f"Хвосты: {fractions['tails']:.2f} л"
-                )
-                bot.send_message(chat_id, response)
-
-                # Сбрасываем состояние пользователя
-                del user_states[chat_id]
-
-            except ValueError:
-                bot.send_message(chat_id, "Ошибка ввода: Введите два числа через пробел.")
-
-            except Exception as e:
-                bot.send_message(chat_id, f"Произошла ошибка: {e}")
-
-        elif state == "awaiting_speed_input":
-            try:
-                # Разбиваем ввод на значения
-                raw_spirit_liters = float(message.text.replace(",", "."))
-
-                # Выполняем расчет скорости отбора
-                speed, max_speed = calculate_speed(chat_id, raw_spirit_liters, user_constants)
-
-                # Отправляем результат пользователю
-                bot.send_message(chat_id,
-                                 f"Минимальная скорость отбора: {speed:.2f} л/ч \n"
-                                 f"Максимальная скорость отбора: {max_speed:.2f} л/ч")
-
-                # Сбрасываем состояние пользователя
-                del user_states[chat_id]
-
-            except ValueError:
-                bot.send_message(chat_id, "Ошибка ввода: Введите два числа через пробел.")
-
-            except Exception as e:
-                bot.send_message(chat_id, f"Произошла ошибка: {e}")
-
-        elif state == "awaiting_set_constants_input":
-            try:
-                update_constants = message.text.replace(",", ".").split()
-                if len(update_constants) != 6:
-                    raise ValueError("Неверное количество значений. Введите ровно 6 чисел.")
-                cube_volume, head, body, pre_tail, tail, avg_head_strength = map(float, update_constants)
-                if not (20 <= cube_volume <= 100):
-                    raise ValueError("Объем куба должен быть в диапазоне 20–100 литров.")
-                if not all(0 <= x <= 100 for x in [head, body, pre_tail, tail]):
-                    raise ValueError("Проценты фракций должны быть в диапазоне 0–100%.")
-                if not (76 <= avg_head_strength <= 95):
-                    raise ValueError("Средняя крепость голов должна быть в диапазоне 76–95%.")
-                # Логируем обновленные константы
-                logging.info(f"Обновленные константы для chat_id {chat_id}: "
-                             f"cube_volume={cube_volume}, head={head}, body={body}, "
-                             f"pre_tail={pre_tail}, tail={tail}, avg_head_strength={avg_head_strength}")
-                user_constants[chat_id] = {
-                    "cube_volume": cube_volume,
-                    "head_percentage": head,
-                    "body_percentage": body,
-                    "pre_tail_percentage": pre_tail,
-                    "tail_percentage": tail,
-                    "average_head_strength": avg_head_strength,
-                }
-                # Сохраняем данные в файл
-                save_to_database(user_constants)
-
-                # Выводим сообщение об успешном обновлении констант
-                bot.send_message(chat_id, "Константы успешно обновлены!")
-
-                # Выводим содержимое базы данных
-                database_content = print_database_content()
-                bot.send_message(chat_id, database_content)
-
-                # Сбрасываем состояние пользователя
-                del user_states[chat_id]
-
-            except ValueError as e:
-                bot.send_message(chat_id, f"Ошибка ввода: {e}")
-            except Exception as e:
-                bot.send_message(chat_id, "Произошла неизвестная ошибка. Попробуйте снова.")
-
-        elif state == "awaiting_correction_input":
-            try:
-                # Разбираем ввод пользователя
-                cube_temp, vapor_temp, measured_alcohol_content = map(float, message.text.replace(",", ".").split())
-
-                # Получаем таблицы равновесия
-                liquid_table = get_liquid_table()
-                vapor_table = get_vapor_table()
-
-                # Рассчитываем теоретическую спиртуозность
-                theoretical_alcohol_content = calculate_alcohol_content(cube_temp, vapor_temp, liquid_table, vapor_table)
-
-                # Вычисляем поправку
-                correction = measured_alcohol_content - theoretical_alcohol_content
-
-                # Сохраняем поправку для пользователя
-                user_constants.setdefault(chat_id, {})["correction"] = correction
-                save_to_database(user_constants)  # Сохраняем в базу данных
-
-                # Отправляем результат пользователю
-                bot.send_message(chat_id, f"Поправка успешно установлена: {correction:.2f}%")
-
-                # Сбрасываем состояние пользователя
-                del user_states[chat_id]
-            except ValueError:
-                bot.send_message(chat_id, "Ошибка ввода: Введите три числа через пробел.")
-            except Exception as e:
-                bot.send_message(chat_id, f"Произошла ошибка: {e}")
-    else:
+    command = conversation.get(user_states.get(chat_id))
+    if command is None:
         bot.send_message(chat_id, "Неизвестная команда. Воспользуйтесь /start для просмотра доступных команд.")
+        return
+    replies, done = command.run(chat_id, message.text)
+    for reply in replies:
+        bot.send_message(chat_id, reply)
+    if done:
+        # Сбрасываем состояние пользователя
+        user_states.pop(chat_id, None)
+
+# Inline-режим: "@бот 84.8 82.2 15" — спиртуозность, "@бот 47 29" — фракции,
+# "@бот 47" — скорость отбора. Ответы считаются по стандартным константам без
+# калибровки, не зависят от пользователя и берутся из общего кэша.
+INLINE_CACHE_SIZE = int(os.getenv("INLINE_CACHE_SIZE", "4096"))
+INLINE_CACHE_TIME = 3600
+
+# Число значений в inline-запросе -> команда диалога, чьи разбор и проверка используются
+INLINE_COMMANDS = {
+    3: "alcohol_calculation",
+    2: "fractions",
+    1: "speed",
+}
+
+INLINE_HELP = (
+    ("help", "Введите числа через пробел",
+     "Inline-режим бота:\n"
+     "84.8 82.2 15 — спиртуозность по температурам куба, пара и дистиллята\n"
+     "47 29 — фракции по объему (л) и крепости (%) спиртосодержащей смеси\n"
+     "47 — скорость отбора по количеству спирта-сырца (л)"),
+)
+
+def parse_inline(text):
+    """
+    Разбирает inline-запрос парсером той команды диалога, которой соответствует число значений.
+    :return: Кортеж чисел или None, если запрос пуст или значений слишком много.
+    :raises ValueError: Если запрос не разобран.
+    """
+    name = INLINE_COMMANDS.get(len(text.split()))
+    if name is None:
+        return None
+    return conversation.get(name).parse(text)
+
+@functools.lru_cache(maxsize=INLINE_CACHE_SIZE)
+def inline_answers(values):
+    """
+    Рассчитывает ответы inline-режима для набора чисел.
+    Числа уже разобраны parse_inline, поэтому nan и бесконечность в кэш не попадают.
+    :param values: Кортеж чисел из запроса.
+    :return: Кортеж (id, заголовок, текст сообщения).
+    """
+    try:
+        command = conversation.get(INLINE_COMMANDS.get(len(values)))
+        if command is not None and command.validate is not None:
+            command.validate(values)
+        if len(values) == 3:
+            cube_temp, vapor_temp, distillate_temp = values
+            alcohol_content = calculate_alcohol_content(cube_temp, vapor_temp, get_liquid_table(), get_vapor_table())
+            text = format_alcohol(correct_for_temperature(alcohol_content, distillate_temp))
+            return (("alcohol", text, f"{cube_temp:g} {vapor_temp:g} {distillate_temp:g}\n{text}"),)
+        if len(values) == 2:
+            fractions = calculate_fractions(None, values[0], values[1], {})
+            return (("fractions", "Фракции (стандартные константы)",
+                     f"Объем {values[0]:g} л, крепость {values[1]:g}%\n{format_fractions(fractions)}"),)
+        if len(values) == 1:
+            speed, max_speed = calculate_speed(None, values[0], {})
+            return (("speed", f"Скорость отбора: {speed:.2f}–{max_speed:.2f} л/ч",
+                     f"Спирт-сырец {values[0]:g} л\n{format_speed(speed, max_speed)}"),)
+    except ValueError as e:
+        return (("error", "Ошибка ввода", f"Ошибка ввода: {e}"),)
+    return INLINE_HELP
+
+def inline_query(query):
+    """
+    Отвечает на inline-запрос результатами из общего кэша.
+    """
+    from telebot.types import InlineQueryResultArticle, InputTextMessageContent
+
+    try:
+        values = parse_inline(query.query)
+        answers = inline_answers(values) if values else INLINE_HELP
+    except ValueError as e:
+        answers = (("error", "Ошибка ввода", f"Ошибка ввода: {e}"),)
+    results = [
+        InlineQueryResultArticle(result_id, title, InputTextMessageContent(text))
+        for result_id, title, text in answers
+    ]
+    try:
+        bot.answer_inline_query(query.id, results, cache_time=INLINE_CACHE_TIME, is_personal=False)
+    except Exception as e:
+        logging.error(f"Ошибка ответа на inline-запрос: {e}")
+
+def register_handlers(bot):
+    """
+    Регистрирует обработчики команд. Общий обработчик ввода должен идти последним.
+    """
+    bot.register_message_handler(start, commands=['start'])
+    # Команды диалога берутся из таблицы conversation
+    for command in conversation:
+        bot.register_message_handler(functools.partial(start_command, command), commands=[command.name])
+    bot.register_message_handler(show_constants, commands=['constants'])
+    bot.register_message_handler(reset_correction, commands=['reset_correction'])
+    bot.register_message_handler(history_command, commands=['history'])
+    bot.register_message_handler(history_csv_command, commands=['history_csv'])
+    bot.register_message_handler(export_command, commands=['export'])
+    bot.register_message_handler(help_command, commands=['help'])
+    bot.register_message_handler(handle_input, func=lambda m: True)
+    bot.register_inline_handler(inline_query, func=lambda q: True)
+
+
+# Состояние запуска для /healthz
+startup_state = {
+    "ready": False,
+    "warmup": "pending",
+    "timings": {},
+}
+
+def warmup():
+    """
+    Прогревает расчетный путь на примере, чтобы первый запрос пользователя
+    не платил за ленивую инициализацию. При gunicorn --preload выполняется в мастере.
+    """
+    started = time.perf_counter()
+    startup_state["warmup"] = "running"
+    try:
+        alcohol_content = calculate_alcohol_content(84.8, 82.2, get_liquid_table(), get_vapor_table())
+        correct_for_temperature(alcohol_content, 15)
+        calculate_fractions("warmup", 47, 29, {})
+        calculate_speed("warmup", 47, {})
+        startup_state["warmup"] = "done"
+    except Exception as e:
+        logging.error(f"Ошибка прогрева: {e}")
+        startup_state["warmup"] = "failed"
+    startup_state["timings"]["warmup"] = time.perf_counter() - started
+
+
+def create_app():
+    """
+    Создает бота и Flask-приложение.
+    Подходит для gunicorn --preload: тяжелые импорты, перенос старого JSON-файла, таблицы
+    и прогрев выполняются один раз в мастере, а соединение с базой открывается в каждом
+    воркере лениво.
+    """
+    global bot
+    started = time.perf_counter()
+
+    # Настройка логирования
+    logging.basicConfig(level=logging.INFO)
+    logging.info(f"Путь к файлу: {os.path.abspath(DATABASE_FILE)}")
+
+    # Перенос старого JSON-файла выполняется до fork, чтобы воркеры не переносили его параллельно
+    migrate_started = time.perf_counter()
+    user_constants.migrate()
+    startup_state["timings"]["migrate"] = time.perf_counter() - migrate_started
+
+    import telebot
+    from flask import Flask, request
+    startup_state["timings"]["imports"] = time.perf_counter() - started
+
+    # Без пула потоков telebot: он создается в мастере и после fork в воркерах не работает,
+    # а обновление и так обрабатывается в потоке запроса воркера gunicorn
+    bot = telebot.TeleBot(TOKEN, threaded=False)
+    register_handlers(bot)
+    app = Flask(__name__)
+
+    @app.route(f"/{TOKEN}", methods=["POST"])
+    def webhook():
+        bot.process_new_updates([telebot.types.Update.de_json(request.stream.read().decode("utf-8"))])
+        return "", 200
+
+    @app.route("/healthz")
+    def healthz():
+        try:
+            user_constants.ping()
+            database = "ok"
+        except Exception as e:
+            logging.error(f"База данных недоступна: {e}")
+            database = "error"
+        ready = startup_state["ready"] and startup_state["warmup"] == "done" and database == "ok"
+        body = {
+            "status": "ok" if ready else "starting",
+            "ready": ready,
+            "warmup": startup_state["warmup"],
+            "database": database,
+            "timings": startup_state["timings"],
+        }
+        return body, 200 if ready else 503
 
-@app.route(f"/{TOKEN}", methods=["POST"])
-def webhook():
-    bot.process_new_updates([telebot.types.Update.de_json(request.stream.read().decode("utf-8"))])
-    return "", 200
\ No newline at end of file
+    warmup()
+    startup_state["timings"]["create_app"] = time.perf_counter() - started
+    startup_state["ready"] = True
+    logging.info(f"Приложение создано за {startup_state['timings']['create_app']:.3f} с")
+    return app
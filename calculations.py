@@ -1,4 +1,19 @@
+import math
 import logging
+from bisect import bisect_left
+
+from tables import LIQUID_TABLE, VAPOR_TABLE, LIQUID_TEMPERATURES, VAPOR_TEMPERATURES
+from user_records import DEFAULT_RECORD
+
+# Поправка спиртуозности к 20°C: температура дистиллята (°C) -> поправка (%)
+TEMPERATURE_CORRECTION_TABLE = {
+    10: 0.6,
+    15: 0.4,
+    20: 0.0,
+    25: -0.3,
+    30: -0.6
+}
+TEMPERATURE_CORRECTION_POINTS = tuple(sorted(TEMPERATURE_CORRECTION_TABLE))
 
 def linear_interpolation(x, x1, x2, y1, y2):
     """
@@ -14,14 +29,25 @@ def find_closest_values(value, data):
     """
     Находит два ближайших значения в массиве.
     :param value: Искомое значение.
-    :param data: Отсортированный массив данных.
+    :param data: Отсортированный по возрастанию массив данных.
     :return: Два ближайших значения из массива.
     """
-    data = sorted(data)
-    for i in range(len(data) - 1):
-        if data[i] <= value <= data[i + 1]:
-            return data[i], data[i + 1]
-    raise ValueError("Значение вне диапазона данных.")
+    if len(data) < 2 or not (data[0] <= value <= data[-1]):
+        raise ValueError("Значение вне диапазона данных.")
+    i = max(bisect_left(data, value), 1)
+    return data[i - 1], data[i]
+
+
+def table_temperatures(table):
+    """
+    Возвращает отсортированные температуры таблицы.
+    Для общих таблиц из tables.py используются заранее построенные кортежи.
+    """
+    if table is LIQUID_TABLE:
+        return LIQUID_TEMPERATURES
+    if table is VAPOR_TABLE:
+        return VAPOR_TEMPERATURES
+    return sorted(table)
 
 
 def calculate_alcohol_content(cube_temp, vapor_temp, liquid_table, vapor_table):
@@ -33,7 +59,7 @@ def calculate_alcohol_content(cube_temp, vapor_temp, liquid_table, vapor_table):
         logging.info(f"Расчет содержания спирта: cube_temp={cube_temp}, vapor_temp={vapor_temp}")
 
         # Интерполяция для жидкости
-        cube_temps = list(liquid_table.keys())
+        cube_temps = table_temperatures(liquid_table)
         logging.debug(f"Температуры жидкости: {cube_temps}")
         cube_temp1, cube_temp2 = find_closest_values(cube_temp, cube_temps)
         logging.debug(f"Ближайшие температуры жидкости: {cube_temp1}, {cube_temp2}")
@@ -46,7 +72,7 @@ def calculate_alcohol_content(cube_temp, vapor_temp, liquid_table, vapor_table):
         logging.debug(f"Интерполированное содержание спирта в жидкости: {liquid_alcohol}")
 
         # Интерполяция для пара
-        vapor_temps = list(vapor_table.keys())
+        vapor_temps = table_temperatures(vapor_table)
         logging.debug(f"Температуры пара: {vapor_temps}")
         vapor_temp1, vapor_temp2 = find_closest_values(vapor_temp, vapor_temps)
         logging.debug(f"Ближайшие температуры пара: {vapor_temp1}, {vapor_temp2}")
@@ -75,14 +101,8 @@ def correct_for_temperature(alcohol_content, distillate_temp):
         logging.info(
             f"Корректировка спиртуозности: alcohol_content={alcohol_content}, distillate_temp={distillate_temp}")
 
-        correction_table = {
-            10: 0.6,
-            15: 0.4,
-            20: 0.0,
-            25: -0.3,
-            30: -0.6
-        }
-        temp_values = list(correction_table.keys())
+        correction_table = TEMPERATURE_CORRECTION_TABLE
+        temp_values = TEMPERATURE_CORRECTION_POINTS
         logging.debug(f"Температуры для коррекции: {temp_values}")
         temp1, temp2 = find_closest_values(distillate_temp, temp_values)
         logging.debug(f"Ближайшие температуры для коррекции: {temp1}, {temp2}")
@@ -103,27 +123,26 @@ def correct_for_temperature(alcohol_content, distillate_temp):
         raise
 
 
-def calculate_fractions(user_id, total_volume_liters, alcohol_content):
+def calculate_fractions(user_id, total_volume_liters, alcohol_content, user_constants):
     """
     Рассчитывает объемы фракций дистиллята на основе констант пользователя или значений по умолчанию.
     :param user_id: ID пользователя (строка).
     :param total_volume_liters: Общий объем спиртосодержащей смеси (л).
     :param alcohol_content: Крепость спиртосодержащей смеси (%).
+    :param user_constants: Записи пользователей (chat_id -> UserRecord).
     :return: Словарь с объемами фракций.
     """
     # Преобразуем user_id в строку для работы с JSON
     user_id = str(user_id)
 
-    # Получаем константы пользователя или используем значения по умолчанию
-    constants = user_constants.get(user_id, get_default_constants())
+    # Получаем запись пользователя или общую запись по умолчанию
+    constants = user_constants.get(user_id, DEFAULT_RECORD)
 
     # Извлекаем константы
-    cube_volume = constants["cube_volume"]
-    head_percentage = constants["head_percentage"]
-    body_percentage = constants["body_percentage"]
-    pre_tail_percentage = constants["pre_tail_percentage"]
-    tail_percentage = constants["tail_percentage"]
-    average_head_strength = constants["average_head_strength"]
+    head_percentage = constants.head_percentage
+    body_percentage = constants.body_percentage
+    pre_tail_percentage = constants.pre_tail_percentage
+    tail_percentage = constants.tail_percentage
 
     # Переводим литры в миллилитры
     total_volume_ml = total_volume_liters * 1000
@@ -152,15 +171,79 @@ def calculate_speed(user_id, raw_spirit_liters, user_constants):
     Рассчитывает скорость отбора на основе объема куба и количества залитого спирта-сырца.
     :param user_id: ID пользователя (строка).
     :param raw_spirit_liters: Количество залитого спирта-сырца (л).
+    :param user_constants: Записи пользователей (chat_id -> UserRecord).
     :return: Минимальная скорость (л/ч) и максимальная скорость (л/ч).
     """
     # Преобразуем user_id в строку для работы с JSON
     user_id = str(user_id)
-    constants = user_constants.get(user_id, get_default_constants())
-    cube_volume = constants.get("cube_volume", 50)
+    cube_volume = user_constants.get(user_id, DEFAULT_RECORD).cube_volume
     if not (20 <= cube_volume <= 100):
         raise ValueError("Объем куба вне допустимого диапазона (20–100 литров).")
     speed_coefficient = 700 if 20 <= cube_volume <= 37 else 600 if 37 < cube_volume <= 50 else 500
     speed = (raw_spirit_liters * 0.35 / speed_coefficient) * 60
     max_speed = speed * 2
-    return speed, max_speed
\ No newline at end of file
+    return speed, max_speed
+
+
+# Калибровка ареометра.
+# Состояние хранится как [n, mean_x, mean_y, m2_x, c_xy, min_x, max_x], где x — теоретическая
+# спиртуозность, y — поправка (показания ареометра минус теория). Суммы
+# обновляются по Уэлфорду, поэтому добавление точки и расчет поправки — O(1).
+# Прямая не экстраполируется: x ограничивается диапазоном [min_x, max_x] точек калибровки.
+
+# Минимальная дисперсия x (%²), при которой учитывается наклон прямой.
+# При меньшем разбросе точек используется средняя поправка.
+MIN_CALIBRATION_VARIANCE = 1.0
+
+
+def add_calibration_point(calibration, x, y):
+    """
+    Добавляет точку калибровки и обновляет накопленные суммы.
+    :param calibration: Текущее состояние калибровки или None.
+    :param x: Теоретическая спиртуозность (%).
+    :param y: Поправка в этой точке (%).
+    :return: Новое состояние калибровки (список из семи чисел).
+    :raises ValueError: Если точка не является конечным числом (nan испортил бы накопленные суммы).
+    """
+    if not (math.isfinite(x) and math.isfinite(y)):
+        raise ValueError("Точка калибровки должна быть конечным числом.")
+    if calibration:
+        n, mean_x, mean_y, m2_x, c_xy, min_x, max_x = calibration
+    else:
+        n, mean_x, mean_y, m2_x, c_xy, min_x, max_x = 0, 0.0, 0.0, 0.0, 0.0, x, x
+
+    n += 1
+    dx = x - mean_x
+    mean_x += dx / n
+    mean_y += (y - mean_y) / n
+    m2_x += dx * (x - mean_x)
+    c_xy += dx * (y - mean_y)
+    return [n, mean_x, mean_y, m2_x, c_xy, min(min_x, x), max(max_x, x)]
+
+
+def calibration_coefficients(calibration):
+    """
+    Возвращает коэффициенты прямой поправки y = intercept + slope * x.
+    :param calibration: Состояние калибровки.
+    :return: Кортеж (intercept, slope).
+    """
+    n, mean_x, mean_y, m2_x, c_xy = calibration[:5]
+    if n < 2 or m2_x / n < MIN_CALIBRATION_VARIANCE:
+        return mean_y, 0.0
+    slope = c_xy / m2_x
+    return mean_y - slope * mean_x, slope
+
+
+def evaluate_calibration(calibration, x):
+    """
+    Рассчитывает поправку для спиртуозности по накопленной калибровке.
+    За пределами диапазона точек калибровки используется поправка на его границе.
+    :param calibration: Состояние калибровки или None.
+    :param x: Рассчитанная спиртуозность (%).
+    :return: Поправка (%).
+    """
+    if not calibration:
+        return 0.0
+    intercept, slope = calibration_coefficients(calibration)
+    min_x, max_x = calibration[5], calibration[6]
+    return intercept + slope * min(max(x, min_x), max_x)
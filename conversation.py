@@ -0,0 +1,117 @@
+import re
+import math
+import logging
+
+# Число с точкой или запятой в качестве разделителя дробной части
+NUMBER_PATTERN = r"[-+]?(?:\d+(?:[.,]\d*)?|[.,]\d+)"
+
+
+class NumberParser:
+    """
+    Разбирает ровно count чисел, разделенных пробелами.
+    Регулярное выражение компилируется один раз при создании. Шаблон не пропускает nan
+    и inf, но слишком длинное число float() превращает в бесконечность, поэтому
+    результат дополнительно проверяется на конечность.
+    """
+    __slots__ = ("count", "error", "_pattern")
+
+    def __init__(self, count, error):
+        """
+        :param count: Ожидаемое количество чисел.
+        :param error: Текст ошибки при неверном вводе.
+        """
+        self.count = count
+        self.error = error
+        self._pattern = re.compile(r"\s*" + r"\s+".join([f"({NUMBER_PATTERN})"] * count) + r"\s*")
+
+    def __call__(self, text):
+        match = self._pattern.fullmatch(text or "")
+        if match is None:
+            raise ValueError(self.error)
+        values = tuple(float(value.replace(",", ".")) for value in match.groups())
+        if not all(map(math.isfinite, values)):
+            raise ValueError("Слишком большое число.")
+        return values
+
+
+class Command:
+    """
+    Команда диалога: приглашение к вводу, разбор, проверка, расчет, формирование ответа и сохранение.
+    Имя команды (/name) служит и состоянием пользователя, ожидающего ввода.
+
+    parse(text) -> values
+    validate(values) -> None, ValueError при недопустимых значениях
+    compute(chat_id, values) -> result
+    commit(chat_id, values, result) -> None, побочные эффекты (база, журнал)
+    format(result) -> строка или кортеж строк (несколько сообщений)
+    """
+    __slots__ = ("name", "prompt", "parse", "validate", "compute", "format", "commit", "error_template", "exclusive")
+
+    def __init__(self, name, prompt, parse, compute, format, validate=None, commit=None,
+                 error_template="Произошла ошибка: {error}", exclusive=False):
+        """
+        :param name: Имя команды Telegram без косой черты.
+        :param prompt: Приглашение к вводу, отправляемое при запуске команды.
+        :param exclusive: Не запускать команду, пока не завершена другая.
+        """
+        self.name = name
+        self.prompt = prompt
+        self.parse = parse
+        self.validate = validate
+        self.compute = compute
+        self.format = format
+        self.commit = commit
+        self.error_template = error_template
+        self.exclusive = exclusive
+
+    def run(self, chat_id, text):
+        """
+        Выполняет все стадии команды.
+        :return: Кортеж (ответы, завершена ли команда). При ошибке состояние сохраняется.
+        """
+        try:
+            values = self.parse(text)
+        except ValueError as e:
+            return (f"Ошибка ввода: {e}",), False
+        try:
+            if self.validate is not None:
+                self.validate(values)
+            result = self.compute(chat_id, values)
+        except ValueError as e:
+            return (f"Ошибка ввода: {e}",), False
+        except Exception as e:
+            logging.error(f"Ошибка в команде /{self.name}: {e}")
+            return (self.error_template.format(error=e),), False
+
+        if self.commit is not None:
+            try:
+                self.commit(chat_id, values, result)
+            except Exception as e:
+                logging.error(f"Ошибка сохранения результата команды /{self.name}: {e}")
+                return (self.error_template.format(error=e),), False
+        replies = self.format(result)
+        if isinstance(replies, str):
+            replies = (replies,)
+        return replies, True
+
+
+class ConversationEngine:
+    """
+    Таблица команд диалога: имя команды (состояние пользователя) -> Command.
+    Выбор команды — один поиск в словаре, независимо от числа команд.
+    """
+
+    def __init__(self):
+        self._commands = {}
+
+    def register(self, command):
+        if command.name in self._commands:
+            raise ValueError(f"Команда /{command.name} уже зарегистрирована.")
+        self._commands[command.name] = command
+        return command
+
+    def get(self, name):
+        return self._commands.get(name)
+
+    def __iter__(self):
+        return iter(self._commands.values())
@@ -0,0 +1,116 @@
+import io
+import csv
+import json
+
+from calculations import calibration_coefficients
+from user_records import CONSTANT_FIELDS, SCHEMA_VERSION
+
+# Ограничения Telegram: длина текстового сообщения (символы) и размер документа,
+# отправляемого ботом (байты). Для документа оставлен запас на multipart-заголовки.
+TELEGRAM_MESSAGE_LIMIT = 4096
+TELEGRAM_DOCUMENT_LIMIT = 50 * 1024 * 1024
+EXPORT_PART_SIZE = TELEGRAM_DOCUMENT_LIMIT - 5 * 1024 * 1024
+
+EXPORT_FORMATS = ("ndjson", "csv")
+
+CSV_COLUMNS = ("chat_id",) + CONSTANT_FIELDS + (
+    "calibration_points",
+    "calibration_intercept",
+    "calibration_slope",
+)
+
+
+def record_row(chat_id, record):
+    """
+    Преобразует запись пользователя в плоский словарь для выгрузки.
+    :param chat_id: ID чата пользователя.
+    :param record: Запись пользователя (UserRecord).
+    :return: Словарь с колонками CSV_COLUMNS.
+    """
+    row = {"chat_id": chat_id}
+    row.update(record.constants)
+    calibration = record.calibration
+    if calibration:
+        intercept, slope = calibration_coefficients(calibration)
+        row.update(calibration_points=calibration[0], calibration_intercept=intercept, calibration_slope=slope)
+    elif record.has_correction:
+        # Старая поправка-смещение без точек калибровки
+        row.update(calibration_points=0, calibration_intercept=record.offset, calibration_slope=0.0)
+    else:
+        row.update(calibration_points=0, calibration_intercept=None, calibration_slope=None)
+    return row
+
+
+def iter_ndjson(records):
+    """
+    Генерирует строки NDJSON: одна запись пользователя на строку.
+    :param records: Итератор пар (chat_id, UserRecord).
+    """
+    for chat_id, record in records:
+        row = record_row(chat_id, record)
+        row["schema_version"] = SCHEMA_VERSION
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def iter_csv(records):
+    """
+    Генерирует строки CSV без заголовка (заголовок добавляет iter_chunks).
+    :param records: Итератор пар (chat_id, UserRecord).
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, lineterminator="\n")
+    for chat_id, record in records:
+        writer.writerow(record_row(chat_id, record))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def csv_header():
+    """
+    Возвращает строку заголовка CSV.
+    """
+    return ",".join(CSV_COLUMNS) + "\n"
+
+
+def iter_chunks(lines, limit, header=None):
+    """
+    Группирует строки в части, каждая из которых не превышает limit байт в UTF-8.
+    Строки не разрываются. Заголовок (например, CSV) повторяется в начале каждой части.
+    :param lines: Итератор строк, каждая заканчивается переводом строки.
+    :param limit: Максимальный размер части (байты).
+    :param header: Строка заголовка или None.
+    :return: Генератор частей (bytes).
+    """
+    header_bytes = header.encode("utf-8") if header else b""
+    parts = []
+    size = 0
+    for line in lines:
+        data = line.encode("utf-8")
+        if len(header_bytes) + len(data) > limit:
+            raise ValueError("Строка выгрузки больше допустимого размера части.")
+        if parts and size + len(data) > limit:
+            yield b"".join(parts)
+            parts = []
+        if not parts:
+            parts.append(header_bytes)
+            size = len(header_bytes)
+        parts.append(data)
+        size += len(data)
+    if parts:
+        yield b"".join(parts)
+
+
+def iter_export(records, export_format, limit=EXPORT_PART_SIZE):
+    """
+    Потоково выгружает записи пользователей частями не больше limit байт.
+    :param records: Итератор пар (chat_id, UserRecord).
+    :param export_format: "ndjson" или "csv".
+    :param limit: Максимальный размер части (байты).
+    :return: Генератор частей (bytes).
+    """
+    if export_format == "ndjson":
+        return iter_chunks(iter_ndjson(records), limit)
+    if export_format == "csv":
+        return iter_chunks(iter_csv(records), limit, header=csv_header())
+    raise ValueError(f"Неизвестный формат выгрузки: {export_format}. Доступны: {', '.join(EXPORT_FORMATS)}.")
@@ -0,0 +1,254 @@
+import os
+import json
+import atexit
+import time
+import queue
+import fcntl
+import struct
+import logging
+import threading
+
+# Формат индекса: смещение начала каждой записи в файле сегмента (uint64, little-endian)
+INDEX_ENTRY = struct.Struct("<Q")
+
+SEGMENT_ENTRIES = 1000
+MAX_SEGMENTS = 5
+QUEUE_SIZE = 10000
+# Сколько секунд ждать записи очереди на диск при выходе процесса
+EXIT_TIMEOUT = 5.0
+
+
+class CalculationHistory:
+    """
+    Журнал расчетов пользователей: только дозапись, NDJSON по сегментам.
+
+    Для каждого пользователя заводится каталог с сегментами NNNNNN.ndjson и индексами
+    NNNNNN.idx (смещения записей), поэтому последние N записей читаются без просмотра
+    файлов целиком. Сегмент закрывается после segment_entries записей, старые сегменты
+    сверх max_segments удаляются. Запись на диск выполняет фоновый поток, чтобы
+    ответ пользователю не ждал дискового ввода-вывода. При обычном завершении процесса
+    очередь дописывается (close через atexit); при аварийном завершении (SIGKILL,
+    таймаут воркера gunicorn) записи, еще не попавшие на диск, теряются.
+    """
+
+    def __init__(self, directory, segment_entries=SEGMENT_ENTRIES, max_segments=MAX_SEGMENTS,
+                 queue_size=QUEUE_SIZE):
+        """
+        :param directory: Каталог журнала.
+        :param segment_entries: Число записей в одном сегменте.
+        :param max_segments: Сколько последних сегментов хранить.
+        :param queue_size: Размер очереди записей, ожидающих записи на диск.
+        """
+        self.directory = directory
+        self.segment_entries = segment_entries
+        self.max_segments = max_segments
+        self.queue_size = queue_size
+        self._queue = None
+        self._writer = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _user_directory(self, chat_id):
+        chat_id = str(chat_id)
+        if not chat_id.lstrip("-").isdigit():
+            raise ValueError(f"Некорректный ID чата: {chat_id}")
+        return os.path.join(self.directory, chat_id)
+
+    def _segments(self, user_directory):
+        """
+        Возвращает номера сегментов пользователя по возрастанию.
+        """
+        try:
+            names = os.listdir(user_directory)
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[:-4]) for name in names if name.endswith(".idx"))
+
+    def _paths(self, user_directory, segment):
+        base = os.path.join(user_directory, f"{segment:06d}")
+        return base + ".ndjson", base + ".idx"
+
+    # Запись
+
+    def _ensure_writer(self):
+        """
+        Запускает фоновый поток записи при первом обращении и после fork.
+        """
+        if self._writer is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(self.queue_size)
+            self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+            self._pid = os.getpid()
+            self._writer.start()
+            atexit.unregister(self.close)
+            atexit.register(self.close)
+
+    def record(self, chat_id, kind, inputs, outputs):
+        """
+        Ставит запись о расчете в очередь на запись. Не блокирует вызывающий поток.
+        :param chat_id: ID чата пользователя.
+        :param kind: Тип расчета (например, "alcohol").
+        :param inputs: Введенные значения.
+        :param outputs: Результаты расчета.
+        """
+        entry = {"t": int(time.time()), "k": kind, "in": list(inputs), "out": list(outputs)}
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((str(chat_id), entry))
+        except queue.Full:
+            logging.warning(f"Очередь журнала расчетов переполнена, запись для {chat_id} пропущена.")
+
+    def flush(self):
+        """
+        Ждет, пока все поставленные в очередь записи попадут на диск.
+        """
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def close(self, timeout=EXIT_TIMEOUT):
+        """
+        Дописывает очередь на диск и останавливает фоновый поток записи.
+        :param timeout: Сколько секунд ждать записи очереди.
+        """
+        with self._lock:
+            if self._writer is None or self._pid != os.getpid():
+                return
+            writer, self._writer = self._writer, None
+        try:
+            # Метка конца очереди: поток завершится, записав все, что стоит перед ней
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            logging.warning("Очередь журнала расчетов не записана полностью при завершении.")
+            return
+        writer.join(timeout)
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            chat_id, entry = item
+            try:
+                self._append(chat_id, entry)
+            except Exception as e:
+                logging.error(f"Ошибка записи журнала расчетов для {chat_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _append(self, chat_id, entry):
+        """
+        Дописывает запись в текущий сегмент, при необходимости открывая новый.
+        Блокировка файла защищает от одновременной записи из нескольких воркеров.
+        """
+        user_directory = self._user_directory(chat_id)
+        os.makedirs(user_directory, exist_ok=True)
+        line = (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+        with open(os.path.join(user_directory, "lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            segments = self._segments(user_directory)
+            segment = segments[-1] if segments else 0
+            data_path, index_path = self._paths(user_directory, segment)
+            if segments and os.path.getsize(index_path) // INDEX_ENTRY.size >= self.segment_entries:
+                segment += 1
+                segments.append(segment)
+                data_path, index_path = self._paths(user_directory, segment)
+
+            # Сначала данные, затем индекс: запись без индекса читатели не увидят
+            with open(data_path, "ab") as data_file:
+                offset = data_file.seek(0, os.SEEK_END)
+                data_file.write(line)
+            with open(index_path, "ab") as index_file:
+                index_file.write(INDEX_ENTRY.pack(offset))
+
+            # Сначала индекс, затем данные: читатели находят сегменты по индексам
+            # и не должны видеть индекс, данные которого уже удалены
+            for old_segment in segments[:-self.max_segments]:
+                for path in reversed(self._paths(user_directory, old_segment)):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+
+    # Чтение
+
+    def _read_segment(self, user_directory, segment, start, stop):
+        """
+        Читает записи сегмента с номерами [start, stop) по индексу.
+        Сегмент, удаленный ротацией во время чтения, дает пустой список.
+        """
+        data_path, index_path = self._paths(user_directory, segment)
+        try:
+            with open(index_path, "rb") as index_file:
+                index_file.seek(start * INDEX_ENTRY.size)
+                raw = index_file.read((stop - start) * INDEX_ENTRY.size)
+            offsets = [value for (value,) in INDEX_ENTRY.iter_unpack(raw)]
+            if not offsets:
+                return []
+            with open(data_path, "rb") as data_file:
+                data_file.seek(offsets[0])
+                # Читаем до конца последней нужной записи (строки заканчиваются переводом строки)
+                lines = []
+                for line in data_file:
+                    lines.append(json.loads(line))
+                    if len(lines) == len(offsets):
+                        break
+        except FileNotFoundError:
+            return []
+        return lines
+
+    def _entry_counts(self, user_directory):
+        """
+        Возвращает пары (сегмент, число записей) по возрастанию номера сегмента.
+        """
+        counts = []
+        for segment in self._segments(user_directory):
+            _, index_path = self._paths(user_directory, segment)
+            try:
+                counts.append((segment, os.path.getsize(index_path) // INDEX_ENTRY.size))
+            except FileNotFoundError:
+                pass
+        return counts
+
+    def last(self, chat_id, limit, skip=0):
+        """
+        Возвращает до limit последних записей, пропустив skip самых новых.
+        Читаются только нужные участки индексов и сегментов.
+        :return: Список записей от новых к старым.
+        """
+        user_directory = self._user_directory(chat_id)
+        entries = []
+        for segment, count in reversed(self._entry_counts(user_directory)):
+            if limit <= 0:
+                break
+            if skip >= count:
+                skip -= count
+                continue
+            stop = count - skip
+            start = max(stop - limit, 0)
+            skip = 0
+            chunk = self._read_segment(user_directory, segment, start, stop)
+            entries.extend(reversed(chunk))
+            limit -= len(chunk)
+        return entries
+
+    def iter_entries(self, chat_id):
+        """
+        Потоково перебирает все хранимые записи пользователя от старых к новым.
+        """
+        user_directory = self._user_directory(chat_id)
+        for segment, count in self._entry_counts(user_directory):
+            data_path, _ = self._paths(user_directory, segment)
+            try:
+                with open(data_path, "rb") as data_file:
+                    for number, line in enumerate(data_file):
+                        if number >= count:
+                            break
+                        yield json.loads(line)
+            except FileNotFoundError:
+                # Сегмент удален ротацией во время чтения
+                continue
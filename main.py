@@ -1,5 +1,12 @@
+import gc
 import os  # Добавляем импорт модуля os
-from bot_handlers import app
+from bot_handlers import create_app
+
+app = create_app()
+
+# Объекты, созданные при запуске, больше не меняются: выводим их из-под сборщика мусора,
+# чтобы воркеры gunicorn --preload не копировали страницы памяти мастера.
+gc.freeze()
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
\ No newline at end of file
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
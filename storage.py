@@ -0,0 +1,206 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+from user_records import UserRecord, legacy_items, load_record, SCHEMA_VERSION
+
+# Метка отсутствующей записи в кэше, чтобы не обращаться к диску повторно
+_MISSING = object()
+
+# PRAGMA user_version базы: 1 — перенос старого JSON-файла завершен
+LEGACY_IMPORTED_VERSION = 1
+
+
+class UserStore:
+    """
+    Хранилище записей пользователей в SQLite.
+    Записи читаются по первому обращению и держатся в LRU-кэше ограниченного размера,
+    поэтому время запуска и память не зависят от общего числа пользователей.
+    """
+
+    def __init__(self, path, cache_size=1024, legacy_path=None):
+        """
+        :param path: Путь к файлу базы данных SQLite.
+        :param cache_size: Максимальное число записей в кэше.
+        :param legacy_path: Путь к старому user_data.json для однократной миграции.
+        """
+        self.path = path
+        self.cache_size = cache_size
+        self.legacy_path = legacy_path
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+        self._connection = None
+        self._pid = None
+        self._data_version = None
+
+    def _open(self):
+        """
+        Открывает новое соединение и создает таблицу, если ее нет.
+        """
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            "chat_id TEXT PRIMARY KEY, "
+            "version INTEGER NOT NULL, "
+            "data BLOB NOT NULL)"
+        )
+        connection.commit()
+        return connection
+
+    def _connect(self):
+        """
+        Открывает соединение при первом обращении и после fork.
+        """
+        if self._connection is not None and self._pid == os.getpid():
+            return self._connection
+        # Соединение, унаследованное от родительского процесса, использовать нельзя
+        self._cache.clear()
+        self._connection = self._open()
+        self._pid = os.getpid()
+        self._data_version = self._read_data_version()
+        logging.info(f"Открыта база данных пользователей: {os.path.abspath(self.path)}")
+        return self._connection
+
+    def migrate(self):
+        """
+        Однократно переносит записи из старого JSON-файла в базу данных.
+        Вызывается в create_app() до fork воркеров; повторный вызов ничего не делает.
+        Завершение отмечается в PRAGMA user_version в той же транзакции, что и перенос,
+        поэтому неудавшийся перенос повторяется при следующем запуске. Записи, уже
+        сохраненные в базе, не перезаписываются.
+        Соединение закрывается, чтобы не передавать его воркерам через fork.
+        """
+        connection = self._open()
+        try:
+            # Транзакция управляется явно: BEGIN IMMEDIATE не пускает других писателей
+            connection.isolation_level = None
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                if connection.execute("PRAGMA user_version").fetchone()[0] < LEGACY_IMPORTED_VERSION:
+                    if self._import_legacy(connection):
+                        connection.execute(f"PRAGMA user_version = {LEGACY_IMPORTED_VERSION}")
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        finally:
+            connection.close()
+
+    def _import_legacy(self, connection):
+        """
+        Переносит записи из старого JSON-файла по одной; некорректные записи пропускаются
+        с предупреждением в логе.
+        :return: False, если файл не удалось прочитать и перенос нужно повторить.
+        """
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return True
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as file:
+                data = file.read()
+            version, items = legacy_items(json.loads(data)) if data.strip() else (SCHEMA_VERSION, ())
+        except (OSError, json.JSONDecodeError, AttributeError, KeyError, TypeError, ValueError) as e:
+            logging.error(f"Не удалось прочитать {self.legacy_path}, перенос будет повторен при следующем запуске: {e}")
+            return False
+
+        imported = skipped = 0
+        for chat_id, raw in items:
+            try:
+                record = load_record(raw, version)
+            except (AttributeError, IndexError, KeyError, TypeError, ValueError) as e:
+                logging.warning(f"Запись {chat_id} из {self.legacy_path} не перенесена: {e}")
+                skipped += 1
+                continue
+            connection.execute(
+                "INSERT OR IGNORE INTO users (chat_id, version, data) VALUES (?, ?, ?)",
+                (chat_id, SCHEMA_VERSION, record.to_bytes()),
+            )
+            imported += 1
+        logging.info(f"Перенесено записей из {self.legacy_path}: {imported}, пропущено: {skipped}")
+        return True
+
+    def _read_data_version(self):
+        return self._connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def _sync(self):
+        """
+        Сбрасывает кэш, если базу изменило другое соединение (другой воркер).
+        PRAGMA data_version не меняется от собственных коммитов соединения.
+        """
+        self._connect()
+        data_version = self._read_data_version()
+        if data_version != self._data_version:
+            self._cache.clear()
+            self._data_version = data_version
+
+    def _remember(self, chat_id, value):
+        self._cache[chat_id] = value
+        self._cache.move_to_end(chat_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def get(self, chat_id, default=None):
+        """
+        Возвращает запись пользователя или default, если записи нет.
+        """
+        with self._lock:
+            self._sync()
+            record = self._cache.get(chat_id)
+            if record is None:
+                row = self._connection.execute(
+                    "SELECT version, data FROM users WHERE chat_id = ?", (chat_id,)
+                ).fetchone()
+                record = UserRecord.from_bytes(row[1], row[0]) if row else _MISSING
+            self._remember(chat_id, record)
+            return default if record is _MISSING else record
+
+    def __contains__(self, chat_id):
+        return self.get(chat_id) is not None
+
+    def __getitem__(self, chat_id):
+        record = self.get(chat_id)
+        if record is None:
+            raise KeyError(chat_id)
+        return record
+
+    def __setitem__(self, chat_id, record):
+        """
+        Сохраняет запись пользователя на диск и в кэш.
+        """
+        with self._lock:
+            self._sync()
+            with self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO users (chat_id, version, data) VALUES (?, ?, ?)",
+                    (chat_id, SCHEMA_VERSION, record.to_bytes()),
+                )
+            self._remember(chat_id, record)
+
+    def ping(self):
+        """
+        Проверяет доступность базы данных.
+        """
+        with self._lock:
+            self._connect().execute("SELECT 1").fetchone()
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def items(self, batch_size=500):
+        """
+        Построчно перебирает все записи, не загружая базу целиком и не заполняя кэш.
+        """
+        with self._lock:
+            cursor = self._connect().execute("SELECT chat_id, version, data FROM users ORDER BY chat_id")
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for chat_id, version, data in rows:
+                yield chat_id, UserRecord.from_bytes(data, version)
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+import bot_handlers
+from storage import UserStore
+
+START_UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 5, "type": "private"},
+        "from": {"id": 5, "is_bot": False, "first_name": "Test"},
+        "text": "/start",
+        "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+    },
+}
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    pytest.importorskip("telebot")
+    pytest.importorskip("flask")
+    monkeypatch.setattr(bot_handlers, "TOKEN", "1:test")
+    monkeypatch.setattr(bot_handlers, "user_constants", UserStore(str(tmp_path / "user_data.db")))
+    return bot_handlers.create_app()
+
+
+def post_start(app):
+    """
+    Отправляет /start на webhook и возвращает число отправленных ботом сообщений.
+    """
+    calls = []
+    bot_handlers.bot.send_message = lambda chat_id, text, **kwargs: calls.append(chat_id)
+    response = app.test_client().post(f"/{bot_handlers.TOKEN}", json=START_UPDATE)
+    assert response.status_code == 200
+    return len(calls)
+
+
+def test_webhook_update_is_handled(app):
+    assert post_start(app) == 1
+
+
+def test_webhook_update_is_handled_after_fork(app):
+    # Как gunicorn --preload: приложение создано в мастере, запросы обрабатывает воркер
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            os.close(read_fd)
+            os.write(write_fd, str(post_start(app)).encode())
+            status = 0
+        finally:
+            os._exit(status)
+    os.close(write_fd)
+    _, status = os.waitpid(pid, 0)
+    with os.fdopen(read_fd) as pipe:
+        calls = pipe.read()
+    assert status == 0
+    assert calls == "1"
@@ -0,0 +1,52 @@
+import pytest
+
+from calculations import add_calibration_point, calibration_coefficients, evaluate_calibration
+
+
+def build(points):
+    calibration = None
+    for x, y in points:
+        calibration = add_calibration_point(calibration, x, y)
+    return calibration
+
+
+def test_single_point_is_constant_offset():
+    calibration = build([(80.0, 1.2)])
+    assert calibration_coefficients(calibration) == (1.2, 0.0)
+    assert evaluate_calibration(calibration, 40.0) == pytest.approx(1.2)
+
+
+def test_fit_matches_least_squares_line():
+    calibration = build([(x, 0.5 + 0.02 * x) for x in (60.0, 70.0, 80.0, 90.0)])
+    intercept, slope = calibration_coefficients(calibration)
+    assert intercept == pytest.approx(0.5)
+    assert slope == pytest.approx(0.02)
+    assert evaluate_calibration(calibration, 75.0) == pytest.approx(2.0)
+
+
+def test_correction_is_clamped_to_calibrated_range():
+    # Две точки 80% и 82% с разницей поправок 1% дают наклон 0.5
+    calibration = build([(80.0, 0.0), (82.0, 1.0)])
+    assert calibration_coefficients(calibration)[1] == pytest.approx(0.5)
+    assert evaluate_calibration(calibration, 40.0) == pytest.approx(0.0)
+    assert evaluate_calibration(calibration, 95.0) == pytest.approx(1.0)
+    assert evaluate_calibration(calibration, 81.0) == pytest.approx(0.5)
+
+
+def test_no_calibration_means_no_correction():
+    assert evaluate_calibration(None, 80.0) == 0.0
+
+
+@pytest.mark.parametrize("x, y", [(float("nan"), 1.0), (80.0, float("inf")), (float("-inf"), 0.0)])
+def test_non_finite_point_is_rejected(x, y):
+    calibration = build([(80.0, 1.0)])
+    with pytest.raises(ValueError):
+        add_calibration_point(calibration, x, y)
+
+
+@pytest.mark.parametrize("values", [(84.8, 82.2, 785.0), (84.8, 82.2, -1.0), (84.8, 82.2, float("inf")),
+                                    (70.0, 82.2, 78.5), (84.8, 101.0, 78.5)])
+def test_calibration_input_is_checked(values):
+    from bot_handlers import check_calibration_input
+    with pytest.raises(ValueError):
+        check_calibration_input(values)
@@ -0,0 +1,115 @@
+import types
+
+import pytest
+
+import bot_handlers
+from conversation import NumberParser, Command, ConversationEngine
+
+
+def test_number_parser():
+    parse = NumberParser(2, "Введите два числа.")
+    assert parse(" 47,5  29 ") == (47.5, 29.0)
+    for text in ("47", "47 29 1", "47 abc", "", None):
+        with pytest.raises(ValueError, match="Введите два числа."):
+            parse(text)
+    with pytest.raises(ValueError):
+        parse("47 " + "9" * 400)
+
+
+def make_command(calls, compute=None, validate=None, commit=None, format=None):
+    def default_commit(chat_id, values, result):
+        calls.append(("commit", chat_id, values, result))
+
+    return Command(
+        "double",
+        prompt="Введите число:",
+        parse=NumberParser(1, "Введите одно число."),
+        validate=validate,
+        compute=compute or (lambda chat_id, values: values[0] * 2),
+        commit=commit or default_commit,
+        format=format or (lambda result: f"{result:g}"),
+        error_template="Ошибка: {error}",
+    )
+
+
+def test_run_success_commits_and_formats():
+    calls = []
+    command = make_command(calls, format=lambda result: ("первое", f"{result:g}"))
+    assert command.run("7", "21") == (("первое", "42"), True)
+    assert calls == [("commit", "7", (21.0,), 42.0)]
+
+
+def test_parse_and_validate_errors_keep_state():
+    calls = []
+
+    def validate(values):
+        if values[0] <= 0:
+            raise ValueError("Число должно быть больше нуля.")
+
+    command = make_command(calls, validate=validate)
+    assert command.run("7", "abc") == (("Ошибка ввода: Введите одно число.",), False)
+    assert command.run("7", "-1") == (("Ошибка ввода: Число должно быть больше нуля.",), False)
+    assert calls == []
+
+
+def test_unexpected_errors_use_error_template():
+    calls = []
+    command = make_command(calls, compute=lambda chat_id, values: 1 / 0)
+    replies, done = command.run("7", "1")
+    assert not done and replies[0].startswith("Ошибка: ")
+
+    def commit(chat_id, values, result):
+        raise OSError("диск")
+
+    command = make_command(calls, commit=commit)
+    assert command.run("7", "1") == (("Ошибка: диск",), False)
+
+
+def test_engine_rejects_duplicate_names():
+    engine = ConversationEngine()
+    command = engine.register(make_command([]))
+    with pytest.raises(ValueError):
+        engine.register(make_command([]))
+    assert engine.get("double") is command
+    assert engine.get(None) is None
+    assert list(engine) == [command]
+
+
+class FakeBot:
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, chat_id, text, **kwargs):
+        self.messages.append(text)
+
+
+@pytest.fixture
+def fake_bot(monkeypatch):
+    fake = FakeBot()
+    monkeypatch.setattr(bot_handlers, "bot", fake)
+    monkeypatch.setattr(bot_handlers, "user_states", {})
+    return fake
+
+
+def start(name, chat_id=5):
+    message = types.SimpleNamespace(chat=types.SimpleNamespace(id=chat_id), text=f"/{name}")
+    bot_handlers.start_command(bot_handlers.conversation.get(name), message)
+
+
+def test_start_command_sets_state_and_prompts(fake_bot):
+    start("speed")
+    assert bot_handlers.user_states == {"5": "speed"}
+    assert fake_bot.messages == [bot_handlers.conversation.get("speed").prompt]
+    # Обычная команда заменяет незавершенную
+    start("fractions")
+    assert bot_handlers.user_states == {"5": "fractions"}
+
+
+def test_exclusive_command_waits_for_pending_one(fake_bot):
+    start("speed")
+    start("set_constants")
+    assert bot_handlers.user_states == {"5": "speed"}
+    assert fake_bot.messages[-1].startswith("Вы уже находитесь в процессе")
+
+    start("set_constants", chat_id=6)
+    assert bot_handlers.user_states["6"] == "set_constants"
@@ -0,0 +1,99 @@
+import types
+
+import pytest
+
+import bot_handlers
+from export import iter_chunks, iter_export, csv_header
+from storage import UserStore
+from user_records import UserRecord
+
+
+def make_records(count):
+    return [(str(1000 + chat_id), UserRecord()) for chat_id in range(count)]
+
+
+def test_parts_fit_limit_and_lines_are_whole():
+    lines = [f"line {number}\n" * (number % 5 + 1) for number in range(200)]
+    parts = list(iter_chunks(lines, 100))
+    assert len(parts) > 1
+    assert all(len(part) <= 100 for part in parts)
+    # Части разрезаны только по границам строк
+    assert b"".join(parts) == "".join(lines).encode("utf-8")
+    assert all(part.endswith(b"\n") for part in parts)
+
+
+def test_csv_header_is_repeated_in_every_part():
+    header = csv_header().encode("utf-8")
+    parts = list(iter_export(make_records(20), "csv", limit=400))
+    assert len(parts) > 1
+    for part in parts:
+        assert len(part) <= 400
+        assert part.startswith(header)
+        assert part.count(header) == 1
+
+
+def test_line_larger_than_limit_is_rejected():
+    with pytest.raises(ValueError):
+        list(iter_chunks(["x" * 20 + "\n"], 10))
+    with pytest.raises(ValueError):
+        list(iter_chunks(["x\n"], 10, header="h" * 10 + "\n"))
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        iter_export(make_records(1), "xml")
+
+
+class FakeBot:
+    def __init__(self):
+        self.messages = []
+        self.documents = []
+
+    def send_message(self, chat_id, text, **kwargs):
+        self.messages.append(text)
+
+    def send_document(self, chat_id, document, visible_file_name=None, **kwargs):
+        self.documents.append((visible_file_name, document.getvalue()))
+
+
+@pytest.fixture
+def admin(tmp_path, monkeypatch):
+    fake_bot = FakeBot()
+    store = UserStore(str(tmp_path / "user_data.db"))
+    monkeypatch.setattr(bot_handlers, "bot", fake_bot)
+    monkeypatch.setattr(bot_handlers, "user_constants", store)
+    monkeypatch.setattr(bot_handlers, "ADMIN_IDS", frozenset({"1"}))
+    return fake_bot, store
+
+
+def export(text):
+    bot_handlers.export_command(types.SimpleNamespace(chat=types.SimpleNamespace(id=1), text=text))
+
+
+def test_small_export_is_sent_as_text(admin):
+    fake_bot, store = admin
+    for chat_id, record in make_records(3):
+        store[chat_id] = record
+    export("/export csv")
+    assert not fake_bot.documents
+    (text,) = fake_bot.messages
+    assert len(text) <= bot_handlers.TELEGRAM_MESSAGE_LIMIT
+    assert text.startswith(csv_header())
+
+
+def test_large_export_is_sent_as_documents(admin):
+    fake_bot, store = admin
+    for chat_id, record in make_records(50):
+        store[chat_id] = record
+    export("/export")
+    assert not fake_bot.messages
+    (name, data), = fake_bot.documents
+    assert name == "users_001.ndjson"
+    assert len(data.decode("utf-8")) > bot_handlers.TELEGRAM_MESSAGE_LIMIT
+    assert data.count(b"\n") == 50
+
+
+def test_export_requires_admin(admin):
+    fake_bot, store = admin
+    bot_handlers.export_command(types.SimpleNamespace(chat=types.SimpleNamespace(id=2), text="/export"))
+    assert fake_bot.messages == ["Команда доступна только администратору."]
@@ -0,0 +1,41 @@
+import os
+
+from history import CalculationHistory
+
+
+def make_history(tmp_path):
+    return CalculationHistory(str(tmp_path), segment_entries=3, max_segments=2)
+
+
+def test_rotation_keeps_last_segments(tmp_path):
+    history = make_history(tmp_path)
+    for number in range(10):
+        history.record("1", "speed", (number,), (number,))
+    history.flush()
+
+    assert sorted(os.listdir(tmp_path / "1")) == ["000002.idx", "000002.ndjson", "000003.idx", "000003.ndjson", "lock"]
+    assert [entry["in"][0] for entry in history.last("1", 5)] == [9, 8, 7, 6]
+    assert [entry["in"][0] for entry in history.last("1", 2, skip=1)] == [8, 7]
+
+
+def test_missing_segment_is_skipped(tmp_path):
+    history = make_history(tmp_path)
+    for number in range(6):
+        history.record("1", "speed", (number,), (number,))
+    history.flush()
+
+    # Индекс еще виден, а данные сегмента уже удалены
+    os.remove(tmp_path / "1" / "000000.ndjson")
+    assert [entry["in"][0] for entry in history.last("1", 6)] == [5, 4, 3]
+    assert [entry["in"][0] for entry in history.iter_entries("1")] == [3, 4, 5]
+
+
+def test_close_writes_queued_entries(tmp_path):
+    history = make_history(tmp_path)
+    history.record("1", "speed", (47,), (1.65, 3.29))
+    history.close()
+
+    assert history.last("1", 1)[0]["out"] == [1.65, 3.29]
+    history.record("1", "speed", (48,), (1.7, 3.4))
+    history.flush()
+    assert len(history.last("1", 10)) == 2
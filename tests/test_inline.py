@@ -0,0 +1,30 @@
+import pytest
+
+from bot_handlers import parse_inline, inline_answers, INLINE_HELP
+
+
+@pytest.mark.parametrize("text", ["nan", "inf", "-inf", "1_0", "47 nan", "1e3", "9" * 400, "47 " + "9" * 400])
+def test_non_numeric_input_is_rejected(text):
+    with pytest.raises(ValueError):
+        parse_inline(text)
+
+
+def test_empty_and_long_queries_show_help():
+    assert parse_inline("") is None
+    assert parse_inline("1 2 3 4") is None
+
+
+def test_inline_uses_conversation_parser():
+    assert parse_inline(" 84,8 82.2  15 ") == (84.8, 82.2, 15.0)
+
+
+@pytest.mark.parametrize("values", [(0.0,), (-47.0,), (47.0, 0.0), (-1.0, 29.0), (47.0, 120.0)])
+def test_non_positive_values_are_rejected(values):
+    (result_id, _, _), = inline_answers(values)
+    assert result_id == "error"
+
+
+def test_valid_query_is_answered():
+    (result_id, _, _), = inline_answers(parse_inline("47"))
+    assert result_id == "speed"
+    assert inline_answers(()) is INLINE_HELP
@@ -0,0 +1,73 @@
+import json
+import sqlite3
+
+from storage import UserStore
+from user_records import UserRecord
+
+
+def make_store(tmp_path, legacy=None, cache_size=1024):
+    legacy_path = tmp_path / "user_data.json"
+    if legacy is not None:
+        legacy_path.write_text(json.dumps(legacy) if not isinstance(legacy, str) else legacy, encoding="utf-8")
+    return UserStore(str(tmp_path / "user_data.db"), cache_size=cache_size, legacy_path=str(legacy_path))
+
+
+def test_migration_skips_only_broken_records(tmp_path):
+    store = make_store(tmp_path, {"1": {"cube_volume": 40}, "2": {"correction": None}})
+    store.migrate()
+    assert store.get("1").cube_volume == 40.0
+    assert store.get("2") is None
+
+
+def test_migration_runs_once_and_keeps_new_writes(tmp_path):
+    store = make_store(tmp_path, {"1": {"cube_volume": 40}})
+    store.migrate()
+    record = UserRecord()
+    record.set_constants(60, 5, 18, 2, 10, 81.5)
+    store["1"] = record
+
+    make_store(tmp_path, {"1": {"cube_volume": 40}}).migrate()
+    assert make_store(tmp_path).get("1").cube_volume == 60.0
+
+
+def test_unreadable_legacy_file_is_retried(tmp_path):
+    store = make_store(tmp_path, "{not json")
+    store.migrate()
+    assert len(store) == 0
+
+    store = make_store(tmp_path, {"1": {"cube_volume": 40}})
+    store.migrate()
+    assert store.get("1").cube_volume == 40.0
+
+
+def test_missing_user_is_none(tmp_path):
+    store = make_store(tmp_path)
+    store.migrate()
+    assert store.get("1") is None
+    assert "1" not in store
+
+
+def test_cache_is_bounded(tmp_path):
+    store = make_store(tmp_path, cache_size=3)
+    for chat_id in range(10):
+        store[str(chat_id)] = UserRecord()
+        store.get(str(chat_id + 100))
+    assert len(store._cache) == 3
+    assert len(store) == 10
+    assert store.get("0") is not None
+
+
+def test_write_from_other_connection_invalidates_cache(tmp_path):
+    store = make_store(tmp_path)
+    assert store.get("1") is None
+
+    other = make_store(tmp_path)
+    record = UserRecord()
+    record.set_constants(40, 5, 18, 2, 10, 81.5)
+    other["1"] = record
+    assert store.get("1").cube_volume == 40.0
+
+    # Запись в обход UserStore тоже меняет data_version
+    with sqlite3.connect(str(tmp_path / "user_data.db")) as connection:
+        connection.execute("DELETE FROM users")
+    assert store.get("1") is None
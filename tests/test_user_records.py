@@ -0,0 +1,56 @@
+import pytest
+
+from calculations import add_calibration_point, calibration_coefficients
+from user_records import UserRecord, DEFAULT_RECORD, load_records, SCHEMA_VERSION, CALIBRATION_OFFSET
+
+
+def test_legacy_record_gets_default_constants():
+    record = UserRecord.from_legacy_dict({"cube_volume": 30})
+    assert record.cube_volume == 30.0
+    assert record.head_percentage == DEFAULT_RECORD.head_percentage
+    assert record.calibration is None
+    assert not record.has_correction
+    assert len(record.to_list()) == CALIBRATION_OFFSET
+
+
+def test_legacy_correction_becomes_offset_only():
+    record = UserRecord.from_legacy_dict({"correction": 1.5})
+    assert record.calibration is None
+    assert record.offset == 1.5
+    assert record.has_correction
+
+
+def test_first_point_after_migration_replaces_legacy_offset():
+    record = UserRecord.from_legacy_dict({"correction": 1.5})
+    record.set_calibration(add_calibration_point(record.calibration, 81.93, -3.43))
+    calibration = record.calibration
+    assert calibration[0] == 1
+    assert record.offset == 0.0
+    intercept, slope = calibration_coefficients(calibration)
+    assert intercept == pytest.approx(-3.43)
+    assert slope == 0.0
+
+
+def test_schema_2_empty_calibration_is_dropped():
+    values = [50.0, 5.0, 18.0, 2.0, 10.0, 81.5, 0.0, 0.0, 0.0, 0.0, 0.0]
+    record = UserRecord.from_list(values, version=2)
+    assert record.to_list() == values[:CALIBRATION_OFFSET]
+
+
+def test_schema_2_calibration_is_upgraded_without_extrapolation():
+    values = [50.0, 5.0, 18.0, 2.0, 10.0, 81.5, 2.0, 81.0, 0.5, 2.0, 1.0]
+    record = UserRecord.from_list(values, version=2)
+    assert record.calibration == [2, 81.0, 0.5, 2.0, 1.0, 81.0, 81.0]
+
+
+def test_bytes_round_trip():
+    record = UserRecord()
+    record.set_constants(40, 5, 20, 2, 10, 81.5)
+    record.set_calibration(add_calibration_point(None, 80.0, 1.0))
+    restored = UserRecord.from_bytes(record.to_bytes(), SCHEMA_VERSION)
+    assert restored.to_list() == record.to_list()
+
+
+def test_load_records_schema_1():
+    records = load_records({"1": {"cube_volume": 40}})
+    assert records["1"].cube_volume == 40.0
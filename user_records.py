@@ -0,0 +1,217 @@
+import logging
+from array import array
+
+# Версия схемы хранения записей пользователей.
+# 1 — словарь с именами полей на каждого пользователя (старый user_data.json).
+# 2 — плоский список чисел: константы, затем состояние калибровки из пяти чисел.
+# 3 — константы и необязательный хвост: ничего, старая поправка-смещение (одно число)
+#     или состояние калибровки с диапазоном x точек (min_x, max_x).
+SCHEMA_VERSION = 3
+
+CONSTANT_FIELDS = (
+    "cube_volume",
+    "head_percentage",
+    "body_percentage",
+    "pre_tail_percentage",
+    "tail_percentage",
+    "average_head_strength",
+)
+
+DEFAULT_CONSTANTS = (50.0, 5.0, 18.0, 2.0, 10.0, 81.5)
+
+# Состояние калибровки: [n, mean_x, mean_y, m2_x, c_xy, min_x, max_x] (см. calculations.py).
+# Индекс начала хвоста записи (смещения или состояния калибровки).
+CALIBRATION_SIZE = 7
+LEGACY_CALIBRATION_SIZE = 5
+CALIBRATION_OFFSET = len(CONSTANT_FIELDS)
+
+# Допустимые длины записи: без поправки, со смещением, с калибровкой
+RECORD_SIZES = (CALIBRATION_OFFSET, CALIBRATION_OFFSET + 1, CALIBRATION_OFFSET + CALIBRATION_SIZE)
+
+
+def upgrade_calibration(calibration):
+    """
+    Дополняет состояние калибровки схемы 2 (пять чисел) диапазоном x.
+    Диапазон точек неизвестен, поэтому берется среднее x: поправка не экстраполируется.
+    """
+    calibration = list(calibration)
+    if len(calibration) == LEGACY_CALIBRATION_SIZE:
+        mean_x = calibration[1]
+        calibration += [mean_x, mean_x]
+    if len(calibration) != CALIBRATION_SIZE:
+        raise ValueError(f"Некорректное состояние калибровки: {calibration}")
+    return calibration
+
+
+def _constant_property(index):
+    return property(lambda self: self._values[index])
+
+
+class UserRecord:
+    """
+    Запись пользователя: константы и поправка в одном массиве double.
+    Поправка занимает место только если задана: одно число для старого смещения
+    или CALIBRATION_SIZE чисел для калибровки.
+    Общая запись по умолчанию хранит значения в кортеже и не изменяется.
+    """
+    __slots__ = ("_values",)
+
+    def __init__(self, values=DEFAULT_CONSTANTS):
+        if len(values) not in RECORD_SIZES:
+            raise ValueError(f"Некорректная длина записи: {len(values)}.")
+        self._values = array("d", values)
+
+    @classmethod
+    def shared(cls, values):
+        """
+        Создает неизменяемую запись (например, общую запись по умолчанию).
+        """
+        record = cls.__new__(cls)
+        record._values = tuple(float(value) for value in values)
+        return record
+
+    cube_volume = _constant_property(0)
+    head_percentage = _constant_property(1)
+    body_percentage = _constant_property(2)
+    pre_tail_percentage = _constant_property(3)
+    tail_percentage = _constant_property(4)
+    average_head_strength = _constant_property(5)
+
+    @property
+    def constants(self):
+        """
+        Возвращает константы пользователя в виде словаря.
+        """
+        return dict(zip(CONSTANT_FIELDS, self._values[:CALIBRATION_OFFSET]))
+
+    @property
+    def calibration(self):
+        """
+        Возвращает состояние калибровки или None, если точек нет.
+        """
+        calibration = self._values[CALIBRATION_OFFSET:]
+        if len(calibration) != CALIBRATION_SIZE:
+            return None
+        return [int(calibration[0])] + list(calibration[1:])
+
+    @property
+    def offset(self):
+        """
+        Возвращает старую поправку-смещение (без калибровки) или 0.
+        """
+        return self._values[CALIBRATION_OFFSET] if len(self._values) == CALIBRATION_OFFSET + 1 else 0.0
+
+    @property
+    def has_correction(self):
+        return len(self._values) > CALIBRATION_OFFSET
+
+    def copy(self):
+        return UserRecord(self._values)
+
+    def set_constants(self, cube_volume, head_percentage, body_percentage,
+                      pre_tail_percentage, tail_percentage, average_head_strength):
+        self._values[:CALIBRATION_OFFSET] = array("d", (
+            cube_volume, head_percentage, body_percentage,
+            pre_tail_percentage, tail_percentage, average_head_strength,
+        ))
+
+    def set_calibration(self, calibration):
+        """
+        Заменяет поправку пользователя состоянием калибровки (None — сбросить поправку).
+        Старое смещение при этом отбрасывается.
+        """
+        self._values[CALIBRATION_OFFSET:] = array("d", calibration or ())
+
+    def to_list(self):
+        """
+        Сериализует запись в список чисел текущей версии схемы.
+        """
+        return list(self._values)
+
+    def to_bytes(self):
+        """
+        Сериализует запись в упакованный массив double текущей версии схемы.
+        """
+        return array("d", self._values).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, version=SCHEMA_VERSION):
+        """
+        Восстанавливает запись из упакованного массива double.
+        """
+        values = array("d")
+        values.frombytes(data)
+        return cls.from_list(values, version)
+
+    @classmethod
+    def from_list(cls, values, version=SCHEMA_VERSION):
+        """
+        Восстанавливает запись из списка чисел указанной версии схемы.
+        """
+        if version not in (2, SCHEMA_VERSION):
+            raise ValueError(f"Неизвестная версия схемы: {version}")
+        constants, tail = list(values[:CALIBRATION_OFFSET]), list(values[CALIBRATION_OFFSET:])
+        # Состояние калибровки без точек хранить не нужно
+        if len(tail) >= LEGACY_CALIBRATION_SIZE and not tail[0]:
+            tail = []
+        if version == 2 and tail:
+            tail = upgrade_calibration(tail)
+        return cls(constants + tail)
+
+    @classmethod
+    def from_legacy_dict(cls, data):
+        """
+        Мигрирует запись схемы 1. Отсутствующие константы берутся по умолчанию,
+        а одиночная поправка "correction" сохраняется как смещение без точек калибровки:
+        первая новая точка калибровки его заменяет.
+        """
+        values = [float(data.get(field, default))
+                  for field, default in zip(CONSTANT_FIELDS, DEFAULT_CONSTANTS)]
+        calibration = data.get("calibration")
+        if calibration and calibration[0]:
+            values.extend(upgrade_calibration(calibration))
+        elif "correction" in data:
+            values.append(float(data["correction"]))
+        return cls(values)
+
+    def __repr__(self):
+        return f"UserRecord({self.to_list()!r})"
+
+
+# Общая неизменяемая запись для пользователей без сохраненных констант
+DEFAULT_RECORD = UserRecord.shared(DEFAULT_CONSTANTS)
+
+
+def legacy_items(data):
+    """
+    Разбирает содержимое старого JSON-файла базы данных.
+    :param data: Десериализованный JSON.
+    :return: Пара (версия схемы, пары chat_id -> сырые данные записи).
+    """
+    version = data.get("schema_version", 1)
+    if version == 1:
+        return version, data.items()
+    return version, data["users"].items()
+
+
+def load_record(raw, version):
+    """
+    Преобразует сырые данные одной записи файла схемы version в UserRecord.
+    Записи схемы 1 мигрируются автоматически.
+    """
+    if version == 1:
+        return UserRecord.from_legacy_dict(raw)
+    return UserRecord.from_list(raw, version)
+
+
+def load_records(data):
+    """
+    Преобразует содержимое файла базы данных в словарь записей.
+    Файлы схемы 1 (без "schema_version") мигрируются автоматически.
+    :param data: Десериализованный JSON.
+    :return: Словарь chat_id -> UserRecord.
+    """
+    version, items = legacy_items(data)
+    if version == 1:
+        logging.info("Миграция базы данных со схемы 1 на схему %s.", SCHEMA_VERSION)
+    return {user_id: load_record(raw, version) for user_id, raw in items}